@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_settings():
+    """py.test получает те же настройки, что manage.py test."""
+    from core.test_runner import isolated_settings
+    with isolated_settings():
+        yield
@@ -1,9 +1,18 @@
+from django.utils.decorators import method_decorator
 from django.views.generic.base import TemplateView
 
+from core.decorators import (
+    conditional, public_if_anonymous, static_page_validators,
+)
 
+cached_page = [public_if_anonymous, conditional(static_page_validators)]
+
+
+@method_decorator(cached_page, name='dispatch')
 class AboutAuthorView(TemplateView):
     template_name = 'about/author.html'
 
 
+@method_decorator(cached_page, name='dispatch')
 class AboutTechView(TemplateView):
     template_name = 'about/tech.html'
@@ -0,0 +1,144 @@
+"""ASGI-вход для синхронного Django."""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class WsgiToAsgi:
+    """Приложение ASGI 3 поверх приложения WSGI."""
+
+    def __init__(self, wsgi_app, max_threads, spool_size=512 * 1024):
+        self.wsgi_app = wsgi_app
+        self.spool_size = spool_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(
+                f'Тип ASGI не поддержан: {scope["type"]}')
+        try:
+            body = await self.read_body(receive)
+        except ClientDisconnected:
+            return
+        with body:
+            await self.respond(scope, body, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса в SpooledTemporaryFile."""
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                raise ClientDisconnected
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    async def respond(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        started = {}
+        # Данные write() по PEP 3333
+        # уходят раньше тела iterable.
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return written.append
+
+        iterable = await loop.run_in_executor(
+            self.executor, self.wsgi_app,
+            self.build_environ(scope, body), start_response)
+        try:
+            chunks = iter(iterable)
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            })
+            while True:
+                await self.send_chunks(send, written)
+                chunk = await loop.run_in_executor(
+                    self.executor, next, chunks, None)
+                if chunk is None:
+                    break
+                await self.send_chunks(send, [chunk])
+            await self.send_chunks(send, written)
+            await send({'type': 'http.response.body'})
+        finally:
+            # close() шлёт request_finished
+            # в потоке пула, как в WSGI.
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+    @staticmethod
+    async def send_chunks(send, chunks):
+        """Отправляет и снимает куски тела."""
+        while chunks:
+            chunk = chunks.pop(0)
+            if chunk:
+                await send({
+                    'type': 'http.response.body',
+                    'body': bytes(chunk),
+                    'more_body': True,
+                })
+
+    def build_environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # Путь в WSGI — байты в latin-1.
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            if name in environ:
+                # Cookie через «; », прочие
+                # через запятую (RFC 7230).
+                separator = '; ' if name == 'HTTP_COOKIE' else ','
+                value = f'{environ[name]}{separator}{value}'
+            environ[name] = value
+        return environ
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.files import locks
+
+EPOCH_KEY = 'two_tier:epoch'
+ADD_LOCK_NAME = 'add.lock'
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Файловый кэш с атомарным add()."""
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Проверку и запись разделяют процессы
+        # одной машины: их сериализует flock.
+        self._createdir()
+        lock_path = os.path.join(self._dir, ADD_LOCK_NAME)
+        with open(lock_path, 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                return super().add(key, value, timeout, version)
+            finally:
+                locks.unlock(lock_file)
+
+
+class TwoTierCache(BaseCache):
+    """LRU процесса (L1) перед общим кэшем (L2)."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._max_l1_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._shared_only = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        self._epoch_interval = options.get('EPOCH_CHECK_INTERVAL', 1)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._epoch_checked = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local(self, key):
+        return not key.startswith(self._shared_only)
+
+    def _check_epoch(self):
+        now = time.monotonic()
+        if now - self._epoch_checked < self._epoch_interval:
+            return
+        self._epoch_checked = now
+        epoch = self.shared.get(EPOCH_KEY)
+        if epoch != self._epoch:
+            with self._lock:
+                self._l1.clear()
+            self._epoch = epoch
+
+    def _l1_get(self, key, version):
+        local_key = self.make_key(key, version)
+        with self._lock:
+            entry = self._l1.get(local_key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._l1[local_key]
+                return False, None
+            self._l1.move_to_end(local_key)
+            return True, value
+
+    def _l1_set(self, key, value, timeout, version):
+        if not self._local(key):
+            return
+        timeout = self.get_backend_timeout(timeout)
+        ttl = self._l1_timeout if timeout is None else min(
+            timeout - time.time(), self._l1_timeout)
+        local_key = self.make_key(key, version)
+        with self._lock:
+            self._l1.pop(local_key, None)
+            if ttl <= 0:
+                return
+            self._l1[local_key] = (value, time.monotonic() + ttl)
+            while len(self._l1) > self._max_l1_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key, version):
+        with self._lock:
+            self._l1.pop(self.make_key(key, version), None)
+
+    def get(self, key, default=None, version=None):
+        if self._local(key):
+            self._check_epoch()
+            found, value = self._l1_get(key, version)
+            if found:
+                return value
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self._l1_set(key, value, self._l1_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        remote = []
+        self._check_epoch()
+        for key in keys:
+            found, value = (
+                self._l1_get(key, version) if self._local(key)
+                else (False, None)
+            )
+            if found:
+                result[key] = value
+            else:
+                remote.append(key)
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                self._l1_set(key, value, self._l1_timeout, version)
+            result.update(fetched)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._l1_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                # В L2 старое значение.
+                self._l1_delete(key, version)
+            else:
+                self._l1_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Атомарность — за add() L2.
+        self._l1_delete(key, version)
+        return self.shared.add(key, value, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(key, version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local(key) and self._l1_get(key, version)[0]:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(key, version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.shared.clear()
+        self._epoch = time.time()
+        self.shared.set(EPOCH_KEY, self._epoch, None)
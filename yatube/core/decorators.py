@@ -0,0 +1,78 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import (
+    add_never_cache_headers, patch_cache_control, patch_vary_headers,
+)
+from django.utils.timezone import now
+from django.views.decorators.http import condition
+
+
+def query_budget(max_queries):
+    """Предел SQL-запросов view."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def conditional(validators_func):
+    """condition() с одним вызовом validators_func."""
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, 'validators'):
+            request.validators = validators_func(request, *args, **kwargs)
+        return request.validators
+
+    def decorator(view_func):
+        conditional_view = condition(
+            etag_func=lambda *args, **kwargs: (
+                get_validators(*args, **kwargs)[0]),
+            last_modified_func=lambda *args, **kwargs: (
+                get_validators(*args, **kwargs)[1]),
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(request, 'stale_page', False):
+                del response['ETag']
+                del response['Last-Modified']
+                add_never_cache_headers(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def viewer_key(request):
+    """Релиз, год и пользователь."""
+    parts = [settings.RELEASE, str(now().year)]
+    user = request.user
+    if user.is_authenticated:
+        parts += [str(user.id), user.username]
+    return '|'.join(parts)
+
+
+def static_page_validators(request, *args, **kwargs):
+    """ETag по зрителю и адресу."""
+    raw = f'{viewer_key(request)}|{request.get_full_path()}'
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"', None
+
+
+def public_if_anonymous(view_func):
+    """Cache-Control для HTML-страниц."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if (request.method not in ('GET', 'HEAD')
+                or response.status_code not in (200, 304)
+                or response.has_header('Cache-Control')):
+            return response
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=0)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
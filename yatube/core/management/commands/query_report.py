@@ -0,0 +1,94 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import querylog
+from core.metrics import Histogram
+
+SORT_KEYS = {
+    'total': lambda histogram: histogram.total,
+    'p99': lambda histogram: histogram.quantile(0.99),
+    'count': lambda histogram: histogram.count,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Самые дорогие SQL-запросы '
+        'из журнала (YATUBE_QUERY_LOG=1).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=settings.QUERY_LOG_DIR,
+            help='Каталог снимков журнала.',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Сколько запросов показать.',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=sorted(SORT_KEYS),
+            default='total',
+            help='Порядок сортировки.',
+        )
+        parser.add_argument(
+            '--by-view',
+            action='store_true',
+            help='Строка на каждый view.',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='EXPLAIN примера, параметры — NULL.',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить снимки после отчёта.',
+        )
+
+    def handle(self, *args, **options):
+        histograms, examples = querylog.load_snapshots(options['dir'])
+        if not histograms:
+            self.stdout.write('Журнал запросов пуст')
+            return
+        rows = self.group(histograms, options['by_view'])
+        sort_key = SORT_KEYS[options['sort']]
+        rows.sort(key=lambda row: sort_key(row[2]), reverse=True)
+        for text, view, histogram in rows[:options['top']]:
+            self.stdout.write(
+                f'[{querylog.fingerprint_id(text)}] '
+                f'{histogram.count} раз, '
+                f'всего {histogram.total / 1000:.1f} мс, '
+                f'p99 {histogram.quantile(0.99) / 1000:.1f} мс, '
+                f'max {histogram.max / 1000:.1f} мс, {view}'
+            )
+            self.stdout.write(f'  {text}')
+            if options['explain'] and text in examples:
+                for line in querylog.explain_template(examples[text]):
+                    self.stdout.write(f'    {line}')
+        if options['clear']:
+            self.clear(options['dir'])
+
+    def group(self, histograms, by_view):
+        if by_view:
+            return [(text, view, histogram)
+                    for (text, view), histogram in histograms.items()]
+        merged = {}
+        views = {}
+        for (text, view), histogram in histograms.items():
+            merged.setdefault(text, Histogram()).merge(histogram)
+            views.setdefault(text, set()).add(view)
+        return [(text, ', '.join(sorted(views[text])), histogram)
+                for text, histogram in merged.items()]
+
+    def clear(self, directory):
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
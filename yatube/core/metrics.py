@@ -0,0 +1,253 @@
+"""Метрики запросов в памяти процесса."""
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.template.base import Template
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+_MISSING = object()
+
+
+class Histogram:
+    """Лог-линейная гистограмма (HdrHistogram)."""
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket(cls, value):
+        shift = max(0, value.bit_length() - 1 - cls.SUB_BUCKET_BITS)
+        return shift, value >> shift
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.buckets[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def as_json(self):
+        return {
+            'buckets': [[*bucket, count]
+                        for bucket, count in self.buckets.items()],
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls()
+        for shift, top, count in data['buckets']:
+            histogram.buckets[shift, top] = count
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
+
+    def quantile(self, q):
+        """Граница корзины q-квантиля."""
+        if not self.count:
+            return 0
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for shift, top in sorted(self.buckets):
+            seen += self.buckets[shift, top]
+            if seen >= rank:
+                return min(((top + 1) << shift) - 1, self.max)
+        return self.max
+
+
+class ViewMetrics:
+    # Имя и множитель в единицы
+    # Prometheus.
+    HISTOGRAMS = (
+        ('latency_seconds', 1e-6),
+        ('db_queries', 1),
+        ('db_time_seconds', 1e-6),
+        ('template_seconds', 1e-6),
+        ('response_bytes', 1),
+    )
+
+    def __init__(self):
+        self.histograms = {name: Histogram() for name, _ in self.HISTOGRAMS}
+        self.responses = defaultdict(int)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def reset(self):
+        with self._lock:
+            self.views.clear()
+
+    def record(self, view, sample, status, size):
+        with self._lock:
+            metrics = self.views[view]
+            histograms = metrics.histograms
+            histograms['latency_seconds'].record(sample.elapsed_us())
+            histograms['db_queries'].record(sample.queries)
+            histograms['db_time_seconds'].record(sample.db_time * 1e6)
+            histograms['template_seconds'].record(sample.template_time * 1e6)
+            if size is not None:
+                histograms['response_bytes'].record(size)
+            metrics.responses[f'{status // 100}xx'] += 1
+            metrics.cache_hits += sample.cache_hits
+            metrics.cache_misses += sample.cache_misses
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+        lines = []
+        with self._lock:
+            views = sorted(self.views.items())
+            for name, scale in ViewMetrics.HISTOGRAMS:
+                metric = f'yatube_view_{name}'
+                lines.append(f'# TYPE {metric} summary')
+                for view, metrics in views:
+                    histogram = metrics.histograms[name]
+                    for q in QUANTILES:
+                        value = histogram.quantile(q) * scale
+                        lines.append(
+                            f'{metric}{{view="{view}",quantile="{q}"}} '
+                            f'{value:g}')
+                    lines.append(
+                        f'{metric}_sum{{view="{view}"}} '
+                        f'{histogram.total * scale:g}')
+                    lines.append(
+                        f'{metric}_count{{view="{view}"}} {histogram.count}')
+            lines.append('# TYPE yatube_view_responses_total counter')
+            for view, metrics in views:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(
+                        'yatube_view_responses_total'
+                        f'{{view="{view}",status="{status}"}} {count}')
+            lines.append('# TYPE yatube_view_cache_requests_total counter')
+            for view, metrics in views:
+                for result, count in (('hit', metrics.cache_hits),
+                                      ('miss', metrics.cache_misses)):
+                    lines.append(
+                        'yatube_view_cache_requests_total'
+                        f'{{view="{view}",result="{result}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Sample:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def elapsed_us(self):
+        return (time.perf_counter() - self.started) * 1e6
+
+    def __enter__(self):
+        _local.sample = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.sample = None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def current_sample():
+    return getattr(_local, 'sample', None)
+
+
+def install(cache_aliases):
+    """Ставит обёртки шаблонов и кэшей."""
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+        Template.render = _timed_render(Template.render)
+        for cache_class in {type(caches[alias]) for alias in cache_aliases}:
+            cache_class.get = _counted_get(cache_class.get)
+            cache_class.get_many = _counted_get_many(cache_class.get_many)
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        sample = current_sample()
+        if sample is None or sample.template_depth:
+            # include учтён внешним.
+            return render(self, context)
+        sample.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            sample.template_depth -= 1
+            sample.template_time += time.perf_counter() - started
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        sample = current_sample()
+        if sample is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            sample.cache_misses += 1
+            return default
+        sample.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        sample = current_sample()
+        if sample is None:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        # Базовый get_many зовёт get.
+        _local.sample = None
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            _local.sample = sample
+        sample.cache_hits += len(found)
+        sample.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
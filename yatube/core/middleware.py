@@ -0,0 +1,99 @@
+import logging
+import random
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics, querylog
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_STATEMENTS = (
+    'BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO',
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """Сверяет число SQL-запросов с бюджетом."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+        ignored = settings.QUERY_BUDGET_IGNORED_TABLES
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal count
+            if not (
+                sql.startswith(TRANSACTION_STATEMENTS)
+                or any(table in sql for table in ignored)
+            ):
+                count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and count > budget:
+            message = (
+                f'{request.resolver_match.view_name}: {count} '
+                f'SQL-запросов при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class MetricsMiddleware:
+    """Выборочные замеры запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.METRICS_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+        metrics.install(settings.METRICS_CACHE_ALIASES)
+        with metrics.Sample() as sample:
+            with connection.execute_wrapper(sample.execute_wrapper):
+                response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None and (
+                match.namespace in settings.METRICS_NAMESPACES):
+            size = None if response.streaming else len(response.content)
+            metrics.registry.record(
+                match.view_name, sample, response.status_code, size)
+        return response
+
+
+class QueryLogMiddleware:
+    """Журнал SQL по отпечаткам."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_LOG_ENABLED:
+            return self.get_response(request)
+        querylog.set_view(None)
+        try:
+            with connection.execute_wrapper(querylog.record_query):
+                response = self.get_response(request)
+        finally:
+            querylog.set_view(None)
+        querylog.stats.flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.QUERY_LOG_ENABLED:
+            querylog.set_view(request.resolver_match.view_name)
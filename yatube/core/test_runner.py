@@ -0,0 +1,30 @@
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def isolated_settings():
+    """Строгие бюджеты и свой каталог кэша."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        shared = dict(settings.CACHES['shared'], LOCATION=cache_dir)
+        with override_settings(
+                CACHES=dict(settings.CACHES, shared=shared),
+                QUERY_BUDGET_STRICT=True):
+            yield
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты manage.py test в isolated_settings."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = ExitStack()
+        self.test_settings.enter_context(isolated_settings())
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.close()
+        super().teardown_test_environment(**kwargs)
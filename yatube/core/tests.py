@@ -1,6 +1,24 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from . import querylog
+from .asgi import WsgiToAsgi
+from .cache import FileBasedCache, TwoTierCache
+from .metrics import Histogram, registry
+from .decorators import query_budget
+from .middleware import QueryBudgetExceeded, QueryBudgetMiddleware
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +27,329 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    """Проверка QueryBudgetMiddleware."""
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.request.resolver_match = resolve('/')
+
+    def run_middleware(self, budget):
+        def get_response(request):
+            get_user_model().objects.count()
+            get_user_model().objects.count()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(get_response)
+        middleware.process_view(
+            self.request, query_budget(budget)(lambda request: None), (), {})
+        return middleware(self.request)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.run_middleware(1)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logged(self):
+        with self.assertLogs('core.middleware', 'WARNING'):
+            response = self.run_middleware(1)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_respected(self):
+        response = self.run_middleware(2)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class TwoTierCacheTest(TestCase):
+    """Двухуровневый кэш."""
+    def setUp(self):
+        options = {
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 2,
+                'EPOCH_CHECK_INTERVAL': 0,
+                'SHARED_ONLY_PREFIXES': ['feed_gen:'],
+            },
+        }
+        self.worker_1 = TwoTierCache('', options)
+        self.worker_2 = TwoTierCache('', options)
+        self.worker_1.clear()
+
+    def test_l1_serves_local_hits(self):
+        self.worker_1.set('card', 'html')
+        caches['shared'].delete('card')
+        self.assertEqual(self.worker_1.get('card'), 'html')
+        self.assertIsNone(self.worker_2.get('card'))
+
+    def test_l1_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.worker_1.set(key, key)
+        caches['shared'].delete_many(['a', 'b', 'c'])
+        self.assertIsNone(self.worker_1.get('a'))
+        self.assertEqual(self.worker_1.get_many(['b', 'c']),
+                         {'b': 'b', 'c': 'c'})
+
+    def test_shared_only_keys_visible_to_all_workers(self):
+        self.worker_2.get('feed_gen:global')
+        self.worker_1.set('feed_gen:global', 'new')
+        self.assertEqual(self.worker_2.get('feed_gen:global'), 'new')
+
+    def test_set_many_skips_failed_keys(self):
+        self.worker_1.set('b', 'old')
+        shared = caches['shared']
+        with mock.patch.object(shared, 'set_many', return_value=['b']):
+            failed = self.worker_1.set_many({'a': 'new', 'b': 'new'})
+        self.assertEqual(failed, ['b'])
+        shared.delete('a')
+        self.assertEqual(self.worker_1.get_many(['a', 'b']),
+                         {'a': 'new', 'b': 'old'})
+
+    def test_clear_invalidates_other_workers(self):
+        self.worker_1.set('card', 'html')
+        self.worker_2.get('card')
+        self.worker_1.clear()
+        self.assertIsNone(self.worker_2.get('card'))
+
+    def test_file_add_is_atomic(self):
+        location = caches['shared']._dir
+        workers = [FileBasedCache(location, {}) for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            added = list(pool.map(
+                lambda worker: worker.add('lock', 'held', 60), workers))
+        self.assertEqual(added.count(True), 1)
+        workers[0].set('lock', 'expired', -1)
+        self.assertTrue(workers[1].add('lock', 'new', 60))
+
+
+class WsgiToAsgiTest(TestCase):
+    """Проверка ASGI-входа поверх WSGI."""
+    def run_app(self, wsgi_app, scope, body_parts=(b'',)):
+        messages = [
+            {'type': 'http.request', 'body': part,
+             'more_body': number < len(body_parts) - 1}
+            for number, part in enumerate(body_parts)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        app = WsgiToAsgi(wsgi_app, max_threads=2)
+        asyncio.run(app({'type': 'http', **scope}, receive, send))
+        return sent
+
+    def test_streams_chunks(self):
+        closed = []
+
+        class Body(list):
+            def close(self):
+                closed.append(True)
+
+        def wsgi_app(environ, start_response):
+            start_response('201 Created', [('X-Path', environ['PATH_INFO'])])
+            return Body([b'a', b'', b'b'])
+
+        sent = self.run_app(
+            wsgi_app, {'method': 'GET', 'path': '/x/', 'headers': []})
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertEqual(sent[0]['headers'], [(b'x-path', b'/x/')])
+        self.assertEqual(
+            [message.get('body') for message in sent[1:]], [b'a', b'b', None])
+        self.assertFalse(sent[-1].get('more_body', False))
+        self.assertEqual(closed, [True])
+
+    def test_request_body_and_headers(self):
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [])
+            return [
+                environ['wsgi.input'].read(),
+                environ['CONTENT_TYPE'].encode(),
+                environ['HTTP_X_TAG'].encode(),
+                environ['HTTP_COOKIE'].encode(),
+                environ['QUERY_STRING'].encode(),
+            ]
+
+        sent = self.run_app(
+            wsgi_app,
+            {
+                'method': 'POST',
+                'path': '/',
+                'query_string': b'q=1',
+                'headers': [
+                    (b'content-type', b'text/plain'),
+                    (b'x-tag', b'a'),
+                    (b'x-tag', b'b'),
+                    (b'cookie', b'a=1'),
+                    (b'cookie', b'b=2'),
+                ],
+            },
+            body_parts=(b'he', b'llo'),
+        )
+        self.assertEqual(
+            [message.get('body') for message in sent[1:-1]],
+            [b'hello', b'text/plain', b'a,b', b'a=1; b=2', b'q=1'])
+
+    def test_legacy_write_goes_first(self):
+        def wsgi_app(environ, start_response):
+            write = start_response('200 OK', [])
+            write(b'a')
+            return [b'b']
+
+        sent = self.run_app(
+            wsgi_app, {'method': 'GET', 'path': '/', 'headers': []})
+        self.assertEqual(
+            [message.get('body') for message in sent[1:]], [b'a', b'b', None])
+
+    def test_errors_go_to_stderr(self):
+        def wsgi_app(environ, start_response):
+            environ['wsgi.errors'].write('oops\n')
+            start_response('200 OK', [])
+            return []
+
+        with mock.patch('sys.stderr', StringIO()) as stderr:
+            self.run_app(
+                wsgi_app, {'method': 'GET', 'path': '/', 'headers': []})
+        self.assertEqual(stderr.getvalue(), 'oops\n')
+
+
+class HistogramTest(TestCase):
+    """Проверка лог-линейной гистограммы."""
+    def test_quantiles_within_relative_error(self):
+        histogram = Histogram()
+        for value in range(1, 100_001):
+            histogram.record(value)
+        error = 1 / 2 ** Histogram.SUB_BUCKET_BITS
+        for q in (0.5, 0.95, 0.99):
+            expected = q * 100_000
+            self.assertLessEqual(
+                abs(histogram.quantile(q) - expected), expected * error)
+        self.assertEqual(histogram.quantile(1), 100_000)
+        self.assertLess(len(histogram.buckets), 500)
+
+
+class MetricsMiddlewareTest(TestCase):
+    """Проверка метрик запросов."""
+    def setUp(self):
+        registry.reset()
+
+    @override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+    def test_views_are_measured(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:tech'))
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret',
+        ).content.decode()
+        self.assertIn(
+            'yatube_view_latency_seconds_count{view="posts:index"} 2', text)
+        self.assertIn(
+            'yatube_view_responses_total{view="about:tech",status="2xx"} 1',
+            text)
+        self.assertIn(
+            'yatube_view_db_queries{view="posts:index",quantile="0.5"}', text)
+        self.assertIn(
+            'yatube_view_cache_requests_total'
+            '{view="posts:index",result="hit"}',
+            text)
+        self.assertNotIn('view="metrics"', text)
+        metrics = registry.views['posts:index']
+        self.assertGreater(metrics.histograms['db_queries'].max, 0)
+        self.assertGreater(metrics.histograms['template_seconds'].max, 0)
+        self.assertGreater(metrics.histograms['response_bytes'].max, 0)
+        self.assertGreater(metrics.cache_hits + metrics.cache_misses, 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(registry.views)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_needs_token_and_internal_address(self):
+        cases = (
+            ({}, HTTPStatus.NOT_FOUND),
+            ({'HTTP_AUTHORIZATION': 'Bearer wrong'}, HTTPStatus.NOT_FOUND),
+            ({'HTTP_AUTHORIZATION': 'Bearer secret',
+              'REMOTE_ADDR': '203.0.113.5'}, HTTPStatus.NOT_FOUND),
+            ({'HTTP_AUTHORIZATION': 'Bearer secret'}, HTTPStatus.OK),
+        )
+        for headers, status in cases:
+            with self.subTest(headers=headers):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, status)
+
+    def test_endpoint_off_without_token(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class QueryLogTest(TestCase):
+    """Журнал запросов."""
+    def setUp(self):
+        querylog.stats.reset()
+        self.addCleanup(querylog.stats.reset)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            querylog.fingerprint(
+                'SELECT "a" FROM "t"  WHERE "id" IN (%s, %s, %s)\n'
+                "AND \"name\" = 'it''s' LIMIT 21"),
+            'SELECT "a" FROM "t" WHERE "id" IN (...) '
+            'AND "name" = ? LIMIT ?')
+        self.assertEqual(
+            querylog.fingerprint('INSERT INTO "t" VALUES (%s, %s), (%s, %s)'),
+            querylog.fingerprint('INSERT INTO "t" VALUES (%s, %s)'))
+
+    def test_views_are_logged_and_reported(self):
+        with override_settings(
+                QUERY_LOG_ENABLED=True, QUERY_LOG_SLOW_MS=0,
+                QUERY_LOG_DIR=self.directory):
+            with self.assertLogs('core.querylog', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        self.assertTrue(any('posts:index' in line for line in logs.output))
+        self.assertTrue(any('SCAN' in line or 'SEARCH' in line
+                            for line in logs.output))
+        views = {view for _, view in querylog.stats.histograms}
+        self.assertEqual(views, {'posts:index'})
+        querylog.stats.flush(self.directory)
+        out = StringIO()
+        call_command(
+            'query_report', dir=self.directory, top=3, explain=True,
+            clear=True, stdout=out)
+        report = out.getvalue()
+        self.assertIn('posts:index', report)
+        self.assertIn('"posts_post"."pub_date" DESC LIMIT ?', report)
+        self.assertIn('SCAN posts_post', report)
+        histograms, _ = querylog.load_snapshots(self.directory)
+        self.assertFalse(histograms)
+
+    def test_parameters_are_not_stored(self):
+        """Ключ сессии не сохраняется."""
+        user = get_user_model().objects.create_user(username='auth')
+        self.client.force_login(user)
+        session_key = self.client.session.session_key
+        with override_settings(
+                QUERY_LOG_ENABLED=True, QUERY_LOG_SLOW_MS=0,
+                QUERY_LOG_DIR=self.directory):
+            with self.assertLogs('core.querylog', 'WARNING') as logs:
+                self.client.get(reverse('posts:follow_index'))
+        querylog.stats.flush(self.directory)
+        path = os.path.join(self.directory, f'queries-{os.getpid()}.json')
+        with open(path, encoding='utf-8') as file:
+            snapshot = file.read()
+        self.assertIn('django_session', snapshot)
+        self.assertNotIn(session_key, snapshot)
+        self.assertNotIn(session_key, '\n'.join(logs.output))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_disabled_by_default(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(querylog.stats.histograms)
@@ -1,9 +1,95 @@
+import datetime
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+
+from . import moderation, search
+from .models import Post, Group, Comment, Follow, ModerationJob
+from .paginator import CappedCountPaginator
+
+GROUP_CHOICES_KEY = 'admin:group_choices'
+
+
+def group_choices():
+    """Кэшированные варианты группы."""
+    choices = cache.get(GROUP_CHOICES_KEY)
+    if choices is None:
+        choices = [('', '---------')] + list(
+            Group.objects.order_by('title').values_list('id', 'title'))
+        cache.set(
+            GROUP_CHOICES_KEY, choices, settings.ADMIN_CHOICES_CACHE_TIME)
+    return choices
+
+
+def month_starts(first, last):
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield datetime.date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """dates() по границам Min/Max."""
+
+    def dates(self, field_name, kind, order='ASC'):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        first, last = bounds['first'], bounds['last']
+        if first is None:
+            return []
+        if settings.USE_TZ:
+            first, last = timezone.localtime(first), timezone.localtime(last)
+        first, last = first.date(), last.date()
+        if kind == 'year':
+            dates = [datetime.date(year, 1, 1)
+                     for year in range(first.year, last.year + 1)]
+        elif kind == 'month':
+            dates = list(month_starts(first, last))
+        else:
+            dates = [first + datetime.timedelta(days=offset)
+                     for offset in range((last - first).days + 1)]
+        if order == 'DESC':
+            dates.reverse()
+        return dates
+
 
-from .models import Post, Group, Comment, Follow
+class ModerationActionForm(ActionForm):
+    group = forms.ChoiceField(
+        label='Группа', choices=group_choices, required=False)
 
 
-class PostAdmin(admin.ModelAdmin):
+def moderate(modeladmin, request, action, params, count):
+    """Модерация сейчас или в фоне."""
+    if count > settings.MODERATION_BACKGROUND_THRESHOLD:
+        job = moderation.submit(action, params)
+        modeladmin.message_user(
+            request,
+            f'Задание №{job.pk} в очереди, '
+            f'выбрано: {count}.',
+        )
+        return
+    done = moderation.run(action, params)
+    modeladmin.message_user(
+        request, f'Обработано записей: {done}.')
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*)."""
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def is_changelist(self, request):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return (request.resolver_match is not None
+                and request.resolver_match.url_name == '%s_%s_changelist'
+                % info)
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,13 +97,147 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    empty_value_display = '-пусто-'
+    action_form = ModerationActionForm
+    actions = (
+        'regroup_selected',
+        'delete_selected_posts',
+        'purge_selected_comments',
+        'delete_selected_authors',
+    )
+
+    def get_actions(self, request):
+        # Вместо каскадного удаления —
+        # delete_selected_posts.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def regroup_selected(self, request, queryset):
+        group_id = request.POST.get('group') or None
+        ranges, count = moderation.id_ranges(queryset)
+        moderate(self, request, ModerationJob.REGROUP, {
+            'post_ranges': ranges,
+            'group_id': group_id and int(group_id),
+        }, count)
+    regroup_selected.short_description = (
+        'Перенести в выбранную группу')
+
+    def delete_selected_posts(self, request, queryset):
+        ranges, count = moderation.id_ranges(queryset)
+        moderate(self, request, ModerationJob.DELETE_POSTS, {
+            'post_ranges': ranges}, count)
+    delete_selected_posts.short_description = (
+        'Удалить выбранные посты')
+
+    def purge_selected_comments(self, request, queryset):
+        ranges, count = moderation.id_ranges(queryset)
+        moderate(self, request, ModerationJob.PURGE_COMMENTS, {
+            'post_ranges': ranges}, count)
+    purge_selected_comments.short_description = (
+        'Удалить все комментарии '
+        'выбранных постов')
+
+    def delete_selected_authors(self, request, queryset):
+        author_ids = sorted(set(
+            queryset.order_by().values_list('author_id', flat=True)))
+        count = Post.objects.filter(author_id__in=author_ids).count()
+        moderate(self, request, ModerationJob.DELETE_AUTHOR, {
+            'author_ids': author_ids}, count)
+    delete_selected_authors.short_description = (
+        'Удалить всё, что написали '
+        'авторы выбранных постов')
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            model=queryset.model, query=queryset.query.chain(),
+            using=queryset.db)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Общие варианты из кэша.
+        if db_field.name == 'group' and self.is_changelist(request):
+            field = db_field.formfield(**kwargs)
+            field.choices = group_choices()
+            return field
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через FTS5.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        cache.delete(GROUP_CHOICES_KEY)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cache.delete(GROUP_CHOICES_KEY)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        cache.delete(GROUP_CHOICES_KEY)
+
+
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+    # Индекс комментариев — с post.
+    ordering = ('-pk',)
     empty_value_display = '-пусто-'
+    actions = ('delete_selected_comments',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_selected_comments(self, request, queryset):
+        ranges, count = moderation.id_ranges(queryset)
+        moderate(self, request, ModerationJob.DELETE_COMMENTS, {
+            'comment_ranges': ranges}, count)
+    delete_selected_comments.short_description = (
+        'Удалить выбранные комментарии')
+
+
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    ordering = ('-pk',)
+
+
+class ModerationJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'action', 'status', 'done', 'total', 'created', 'updated')
+    list_filter = ('status',)
+    readonly_fields = (
+        'action', 'params', 'status', 'done', 'total', 'error', 'created',
+        'updated',
+    )
+
+    def has_add_permission(self, request):
+        return False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(ModerationJob, ModerationJobAdmin)
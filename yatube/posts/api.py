@@ -0,0 +1,123 @@
+"""JSON-версии лент и страницы поста."""
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.vary import vary_on_cookie
+
+from core.decorators import conditional, query_budget
+from .models import Comment, Post
+from .paginator import CommentPaginator, CursorPaginator
+from .timeline import TimelinePaginator
+from .validators import (
+    follow_validators, get_author, get_group, group_validators,
+    index_validators, post_validators, profile_validators,
+)
+
+COUNT_POSTS = 10
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug', 'image',
+    'comments_count',
+)
+
+
+def serialize_post(row):
+    image = row['image']
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': Post.image.field.storage.url(image) if image else None,
+        'comments_count': row['comments_count'],
+    }
+
+
+def page_response(request, paginator):
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return JsonResponse({
+        'results': [serialize_post(row) for row in page_obj],
+        'next': paginator.next_cursor if page_obj.has_next() else None,
+        'previous': (
+            paginator.previous_cursor if page_obj.has_previous() else None),
+    })
+
+
+def feed_response(request, posts):
+    paginator = CursorPaginator(posts.values(*POST_FIELDS), COUNT_POSTS)
+    return page_response(request, paginator)
+
+
+class ValuesTimelinePaginator(TimelinePaginator):
+    def load_posts(self, ids):
+        return {row['id']: row for row in self.posts.filter(id__in=ids)}
+
+
+def api_login_required(view_func):
+    """403 вместо редиректа на вход."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise PermissionDenied
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+@query_budget(2)
+@conditional(index_validators)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@query_budget(3)
+@conditional(group_validators)
+def group_posts(request, slug):
+    return feed_response(request, get_group(request, slug).posts.all())
+
+
+@query_budget(3)
+@conditional(profile_validators)
+def profile(request, username):
+    return feed_response(
+        request, get_author(request, username).posts.all())
+
+
+@query_budget(9)
+@api_login_required
+@vary_on_cookie
+@conditional(follow_validators)
+def follow_index(request):
+    paginator = ValuesTimelinePaginator(
+        request.user, COUNT_POSTS, posts=Post.objects.values(*POST_FIELDS))
+    return page_response(request, paginator)
+
+
+@query_budget(4)
+@conditional(post_validators)
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.values(*POST_FIELDS), id=post_id)
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).values(
+            'id', 'author__username', 'text', 'created'),
+        settings.COMMENTS_PER_PAGE,
+    )
+    comments_page = paginator.get_page(after=request.GET.get('after'))
+    data = serialize_post(post)
+    data['comments'] = [
+        {
+            'id': comment['id'],
+            'author': comment['author__username'],
+            'text': comment['text'],
+            'created': comment['created'],
+        }
+        for comment in comments_page
+    ]
+    data['comments_next'] = (
+        paginator.next_cursor if comments_page.has_next() else None)
+    return JsonResponse(data)
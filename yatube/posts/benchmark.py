@@ -0,0 +1,535 @@
+"""Нагрузочный прогон страниц yatube."""
+import asyncio
+import io
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer, WSGIRequestHandler,
+)
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from core.asgi import WsgiToAsgi
+from core.metrics import Histogram
+
+from . import thumbnails
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+DEFAULT_SIZES = {
+    'users': 50,
+    'groups': 10,
+    'posts': 2000,
+    'follows': 10,
+    'comments': 5000,
+    'images': 20,
+}
+QUANTILES = (0.5, 0.95, 0.99)
+LOCALE = 'ru_RU'
+
+
+@contextmanager
+def isolated(directory):
+    """Отдельные база, кэш и медиа."""
+    database = connections[DEFAULT_DB_ALIAS]
+    test_settings = database.settings_dict['TEST']
+    old_test_name = test_settings['NAME']
+    if database.vendor == 'sqlite':
+        # Файл: его видят потоки сервера.
+        test_settings['NAME'] = os.path.join(directory, 'db.sqlite3')
+    old_name = database.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    shared = dict(
+        settings.CACHES['shared'],
+        LOCATION=os.path.join(directory, 'cache'),
+    )
+    try:
+        with override_settings(
+                DEBUG=False,
+                QUERY_BUDGET_STRICT=False,
+                MEDIA_ROOT=os.path.join(directory, 'media'),
+                CACHES=dict(settings.CACHES, shared=shared)):
+            yield
+    finally:
+        database.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+def make_image(rng, size=(640, 480)):
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in 'rgb'))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def seed(sizes, seed=0):
+    """Наполняет базу; подписки — до постов."""
+    rng = random.Random(seed)
+    fake = Faker(LOCALE)
+    fake.seed_instance(seed)
+    with transaction.atomic():
+        users = [
+            mixer.blend(User, username=f'{fake.user_name()}_{number}')
+            for number in range(sizes['users'])
+        ]
+        groups = [
+            mixer.blend(
+                Group,
+                title=fake.sentence(nb_words=3)[:200],
+                slug=f'group-{number}',
+                description=fake.paragraph(),
+            )
+            for number in range(sizes['groups'])
+        ]
+        for user in users:
+            authors = [author for author in users if author != user]
+            for author in rng.sample(
+                    authors, min(sizes['follows'], len(authors))):
+                mixer.blend(Follow, user=user, author=author)
+        posts = [
+            mixer.blend(
+                Post,
+                text=fake.paragraph(nb_sentences=rng.randint(1, 8)),
+                author=rng.choice(users),
+                group=rng.choice(groups) if groups and rng.random() < 0.7
+                else None,
+                image='',
+            )
+            for _ in range(sizes['posts'])
+        ]
+        for number, post in enumerate(
+                rng.sample(posts, min(sizes['images'], len(posts)))):
+            post.image.save(
+                f'bench_{number}.jpg', ContentFile(make_image(rng)))
+            thumbnails.enqueue(post.image.name)
+        for _ in range(sizes['comments'] if posts else 0):
+            mixer.blend(
+                Comment,
+                post=rng.choice(posts),
+                author=rng.choice(users),
+                text=fake.sentence(),
+            )
+
+
+class Dataset:
+    """Что есть в базе для сценариев."""
+
+    def __init__(self):
+        self.users = list(User.objects.order_by('id'))
+        self.group_slugs = list(
+            Group.objects.order_by('id').values_list('slug', flat=True))
+        self.group_ids = list(
+            Group.objects.order_by('id').values_list('id', flat=True))
+        self.post_ids = list(
+            Post.objects.order_by('id').values_list('id', flat=True))
+
+
+class Scenario:
+    def __init__(self, name, build, login=False):
+        self.name = name
+        self.build = build
+        self.login = login
+
+
+def _index(data, rng, fake):
+    return 'get', reverse('posts:index'), None
+
+
+def _group(data, rng, fake):
+    slug = rng.choice(data.group_slugs)
+    return 'get', reverse('posts:group_list', args=[slug]), None
+
+
+def _profile(data, rng, fake):
+    username = rng.choice(data.users).username
+    return 'get', reverse('posts:profile', args=[username]), None
+
+
+def _detail(data, rng, fake):
+    post_id = rng.choice(data.post_ids)
+    return 'get', reverse('posts:post_detail', args=[post_id]), None
+
+
+def _follow(data, rng, fake):
+    return 'get', reverse('posts:follow_index'), None
+
+
+def _create(data, rng, fake):
+    form = {'text': fake.paragraph()}
+    if data.group_ids:
+        form['group'] = rng.choice(data.group_ids)
+    return 'post', reverse('posts:post_create'), form
+
+
+def _comment(data, rng, fake):
+    post_id = rng.choice(data.post_ids)
+    return ('post', reverse('posts:add_comment', args=[post_id]),
+            {'text': fake.sentence()})
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario('index', _index),
+        Scenario('group', _group),
+        Scenario('profile', _profile),
+        Scenario('detail', _detail),
+        Scenario('follow', _follow, login=True),
+        Scenario('create', _create, login=True),
+        Scenario('comment', _comment, login=True),
+    )
+}
+
+
+class ClientDriver:
+    """Тестовый клиент Django."""
+    name = 'client'
+
+    def session(self, user):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+
+        def request(method, path, data):
+            return getattr(client, method)(path, data).status_code
+
+        return request
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpDriver:
+    """Локальный WSGI-сервер по HTTP."""
+    name = 'http'
+
+    def __init__(self):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler)
+        self.server.set_app(get_wsgi_application())
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def session(self, user):
+        session = requests.Session()
+        headers = {}
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+            session.cookies.set(settings.SESSION_COOKIE_NAME, cookie)
+            # Форма выдаёт cookie CSRF.
+            session.get(self.base_url + reverse('posts:post_create'))
+            headers['X-CSRFToken'] = session.cookies.get(
+                settings.CSRF_COOKIE_NAME, '')
+
+        def request(method, path, data):
+            url = self.base_url + path
+            if method == 'get':
+                response = session.get(
+                    url, params=data, allow_redirects=False)
+            else:
+                response = session.post(
+                    url, data=data, headers=headers, allow_redirects=False)
+            return response.status_code
+
+        return request
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class AsgiDriver:
+    """ASGI-вход WsgiToAsgi в процессе."""
+    name = 'asgi'
+
+    def __init__(self):
+        self.app = WsgiToAsgi(
+            get_wsgi_application(),
+            max_threads=settings.ASGI_THREADS,
+            spool_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def session(self, user):
+        cookies = {}
+        headers = []
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            cookies[settings.SESSION_COOKIE_NAME] = client.cookies[
+                settings.SESSION_COOKIE_NAME].value
+            # Форма выдаёт cookie CSRF.
+            self.call('get', reverse('posts:post_create'), None, cookies)
+            headers.append((
+                b'x-csrftoken',
+                cookies.get(settings.CSRF_COOKIE_NAME, '').encode()))
+
+        def request(method, path, data):
+            return self.call(method, path, data, cookies, headers)
+
+        return request
+
+    def call(self, method, path, data, cookies, headers=()):
+        """Запрос в цикле событий драйвера."""
+        encoded = urlencode(data or {}).encode()
+        body = encoded if method == 'post' else b''
+        request_headers = [(b'host', b'testserver'), *headers]
+        if cookies:
+            request_headers.append((b'cookie', '; '.join(
+                f'{name}={value}' for name, value in cookies.items()
+            ).encode()))
+        if method == 'post':
+            request_headers += [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ]
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method.upper(),
+            'scheme': 'http',
+            'path': path,
+            'query_string': b'' if method == 'post' else encoded,
+            'root_path': '',
+            'headers': request_headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        status, response_headers = asyncio.run_coroutine_threadsafe(
+            self.send_request(scope, body), self.loop).result()
+        for name, value in response_headers:
+            if name == b'set-cookie':
+                cookie = SimpleCookie(value.decode('latin-1'))
+                cookies.update(
+                    (key, morsel.value) for key, morsel in cookie.items())
+        return status
+
+    async def send_request(self, scope, body):
+        messages = [{'type': 'http.request', 'body': body}]
+        started = {}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                started.update(message)
+
+        await self.app(scope, receive, send)
+        return started['status'], started['headers']
+
+    def close(self):
+        self.app.executor.shutdown(wait=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+DRIVERS = {
+    driver.name: driver for driver in (ClientDriver, HttpDriver, AsgiDriver)
+}
+
+
+class ScenarioError(Exception):
+    """Сценарий упал при разогреве."""
+
+
+class ScenarioRun:
+    """Потоки одного сценария."""
+
+    def __init__(self, driver, scenario, data, warmup, seed):
+        self.driver = driver
+        self.scenario = scenario
+        self.data = data
+        self.warmup = warmup
+        self.seed = seed
+        self.histogram = Histogram()
+        self.errors = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def start(self, count, concurrency):
+        """Секунды замера без разогрева."""
+        self.ready = threading.Barrier(concurrency + 1)
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                index,
+                count // concurrency + (index < count % concurrency),
+            ))
+            for index in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        self.ready.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def worker(self, index, share):
+        rng = random.Random(f'{self.seed}:{self.scenario.name}:{index}')
+        fake = Faker(LOCALE)
+        fake.seed_instance(rng.random())
+        request = None
+        try:
+            request = self.warm_up(rng, fake)
+        except Exception as error:
+            with self.lock:
+                self.failures.append(error)
+        finally:
+            self.ready.wait()
+        try:
+            # После барьера failures полон.
+            if not self.failures:
+                self.measure(request, share, rng, fake)
+        finally:
+            connection.close()
+
+    def warm_up(self, rng, fake):
+        """Сессия потока после разогрева."""
+        user = rng.choice(self.data.users) if self.scenario.login else None
+        request = self.driver.session(user)
+        for _ in range(self.warmup):
+            request(*self.scenario.build(self.data, rng, fake))
+        return request
+
+    def measure(self, request, share, rng, fake):
+        for _ in range(share):
+            method, path, form = self.scenario.build(self.data, rng, fake)
+            started = time.perf_counter()
+            try:
+                failed = request(method, path, form) >= 400
+            except Exception:
+                failed = True
+            elapsed = (time.perf_counter() - started) * 1e6
+            with self.lock:
+                self.histogram.record(elapsed)
+                if failed:
+                    self.errors.append(path)
+
+
+def run_scenario(driver, scenario, data, count, concurrency, warmup,
+                 seed=0):
+    """count запросов в concurrency потоках."""
+    run = ScenarioRun(driver, scenario, data, warmup, seed)
+    elapsed = run.start(count, concurrency)
+    if run.failures:
+        error = run.failures[0]
+        raise ScenarioError(
+            f'{scenario.name}: {type(error).__name__}: {error}'
+        ) from error
+    return summarize(run.histogram, len(run.errors), elapsed)
+
+
+def summarize(histogram, errors, elapsed):
+    result = {
+        'requests': histogram.count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(histogram.count / elapsed, 1) if elapsed else 0,
+        'max_ms': round(histogram.max / 1000, 2),
+        'histogram': histogram.as_json(),
+    }
+    for q in QUANTILES:
+        result[f'p{round(q * 100)}_ms'] = round(
+            histogram.quantile(q) / 1000, 2)
+    return result
+
+
+def run(driver, scenario_names, data, count, concurrency, warmup, seed=0):
+    return {
+        name: run_scenario(
+            driver, SCENARIOS[name], data, count, concurrency, warmup, seed)
+        for name in scenario_names
+    }
+
+
+def format_table(results):
+    """Таблица отчёта."""
+    lines = [
+        f'{"сценарий":<16}{"запросов":>9}'
+        f'{"ошибок":>8}{"rps":>9}'
+        f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"max, мс":>10}'
+    ]
+    for driver_name, scenarios in results.items():
+        for name, row in scenarios.items():
+            lines.append(
+                f'{driver_name + ":" + name:<16}{row["requests"]:>9}'
+                f'{row["errors"]:>8}{row["rps"]:>9}'
+                f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}'
+                f'{row["p99_ms"]:>10}{row["max_ms"]:>10}'
+            )
+    return '\n'.join(lines)
+
+
+def save_baseline(path, report):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(baseline, report, threshold):
+    """Строки сравнения и регрессии."""
+    lines = []
+    regressions = []
+    for driver_name, scenarios in report['results'].items():
+        old_scenarios = baseline['results'].get(driver_name, {})
+        for name, row in scenarios.items():
+            label = f'{driver_name}:{name}'
+            old = old_scenarios.get(name)
+            if old is None:
+                lines.append(f'{label}: нет в базовой линии')
+                continue
+            changes = {
+                key: percent_change(old[key], row[key])
+                for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms')
+            }
+            lines.append(f'{label}: ' + ', '.join(
+                f'{key} {old[key]} → {row[key]} ({change:+.1f}%)'
+                for key, change in changes.items()))
+            if (changes['p95_ms'] > threshold
+                    or changes['rps'] < -threshold):
+                regressions.append(label)
+    return lines, regressions
+
+
+def percent_change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
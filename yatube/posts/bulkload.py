@@ -0,0 +1,234 @@
+import codecs
+import json
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers import python
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+READ_SIZE = 64 * 1024
+
+# Эти строки создаёт migrate: они ищутся
+# по естественному ключу, ссылки на них
+# переводятся на id в базе.
+NATURAL_MODELS = (ContentType, Permission)
+
+
+SEPARATORS = ' \t\r\n,'
+
+
+class JsonArrayReader:
+    """Потоковый разбор JSON-массива."""
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def __iter__(self):
+        if self.next_char() != '[':
+            raise ValueError('Нужен JSON-массив')
+        self.position += 1
+        while self.next_char() != ']':
+            yield self.next_item()
+
+    def fill(self):
+        """Дочитывает кусок потока."""
+        chunk = self.stream.read(self.read_size)
+        self.eof = not chunk
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk, final=self.eof)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def next_char(self):
+        """Символ после пробелов и запятых."""
+        while True:
+            while (self.position < len(self.buffer)
+                   and self.buffer[self.position] in SEPARATORS):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('Массив не закрыт')
+            self.fill()
+
+    def next_item(self):
+        """Элемент с текущей позиции."""
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(
+                    self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # Край буфера мог оборвать число.
+            if end < len(self.buffer) or self.eof:
+                self.position = end
+                return item
+            self.fill()
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """Элементы JSON-массива по одному."""
+    return iter(JsonArrayReader(stream, read_size))
+
+
+def iter_json_lines(stream):
+    """Объекты JSON Lines."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_fixture(stream, name):
+    if '.jsonl' in name:
+        return iter_json_lines(stream)
+    return iter_json_array(stream)
+
+
+class BulkLoader:
+    """Многострочные INSERT без сигналов."""
+
+    def __init__(self, batch_size, ignore_conflicts=False,
+                 using=DEFAULT_DB_ALIAS, progress=None):
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.using = using
+        self.progress = progress
+        self.pending = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.remapped = defaultdict(dict)
+        self.remap_fields = {}
+        self.total = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.total / elapsed if elapsed else 0.0
+
+    def add(self, model, rows):
+        pending = self.pending[model]
+        pending.extend(rows)
+        if len(pending) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        rows = self.pending.pop(model, [])
+        if not rows:
+            return
+        self.insert(model, rows)
+        self.counts[model] += len(rows)
+        self.total += len(rows)
+        if self.progress is not None:
+            self.progress(self)
+
+    def insert(self, model, rows):
+        """INSERT raw, с pk и без — отдельно."""
+        with_pk = [row for row in rows if row.pk is not None]
+        without_pk = [row for row in rows if row.pk is None]
+        fields = model._meta.local_concrete_fields
+        self.insert_rows(model, with_pk, fields)
+        self.insert_rows(model, without_pk, [
+            field for field in fields if not field.primary_key])
+
+    def insert_rows(self, model, rows, fields):
+        if not rows:
+            return
+        connection = connections[self.using]
+        batch_size = min(
+            self.batch_size,
+            connection.ops.bulk_batch_size(fields, rows) or self.batch_size)
+        queryset = model._base_manager.using(self.using)
+        for start in range(0, len(rows), batch_size):
+            queryset._insert(
+                rows[start:start + batch_size],
+                fields=fields,
+                using=self.using,
+                raw=True,
+                ignore_conflicts=self.ignore_conflicts,
+            )
+
+    def flush_all(self):
+        for model in list(self.pending):
+            self.flush(model)
+
+    def load(self, records):
+        for deserialized in python.Deserializer(records, using=self.using):
+            obj = deserialized.object
+            self.remap(obj)
+            if isinstance(obj, NATURAL_MODELS):
+                self.resolve(obj)
+                continue
+            self.add(type(obj), [obj])
+            for name, pks in (deserialized.m2m_data or {}).items():
+                self.add_m2m(obj, type(obj)._meta.get_field(name), pks)
+        self.flush_all()
+
+    def add_m2m(self, obj, field, pks):
+        through = field.remote_field.through
+        mapping = self.remapped[field.related_model]
+        self.add(through, [
+            through(**{
+                f'{field.m2m_field_name()}_id': obj.pk,
+                f'{field.m2m_reverse_field_name()}_id': mapping.get(pk, pk),
+            })
+            for pk in pks
+        ])
+
+    def remap(self, obj):
+        """Ссылки на NATURAL_MODELS — на id в базе."""
+        model = type(obj)
+        if model not in self.remap_fields:
+            self.remap_fields[model] = [
+                field for field in model._meta.concrete_fields
+                if field.is_relation
+                and field.related_model in NATURAL_MODELS
+            ]
+        for field in self.remap_fields[model]:
+            mapping = self.remapped[field.related_model]
+            value = getattr(obj, field.attname)
+            setattr(obj, field.attname, mapping.get(value, value))
+
+    def resolve(self, obj):
+        """Ищет строку по ключу или создаёт."""
+        model = type(obj)
+        manager = model.objects.db_manager(self.using)
+        try:
+            existing = manager.get_by_natural_key(*obj.natural_key())
+        except model.DoesNotExist:
+            existing = manager.create(**{
+                field.attname: getattr(obj, field.attname)
+                for field in model._meta.concrete_fields
+                if not field.primary_key
+            })
+        self.remapped[model][obj.pk] = existing.pk
+        self.counts[model] += 1
+        self.total += 1
+
+    def run(self, *sources):
+        """Все источники в одной транзакции."""
+        connection = connections[self.using]
+        with transaction.atomic(using=self.using):
+            with connection.constraint_checks_disabled():
+                for records in sources:
+                    self.load(records)
+            connection.check_constraints(table_names=[
+                model._meta.db_table for model in self.counts])
+            sequence_sql = connection.ops.sequence_reset_sql(
+                no_style(), list(self.counts))
+            with connection.cursor() as cursor:
+                for line in sequence_sql:
+                    cursor.execute(line)
+        return self.counts
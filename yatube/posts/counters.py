@@ -0,0 +1,79 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики через F()."""
+    # Строку создаёт только рост: при
+    # каскадном удалении её не воскрешаем.
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def bump_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def recount_comments(post_ids):
+    """comments_count одним UPDATE."""
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count_subquery(Comment.objects, 'post'))
+
+
+def _count_subquery(queryset, field):
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def rebuild_user_stats(dry_run=False):
+    """Чинит счётчики; число правок."""
+    actual = User.objects.annotate(
+        real_posts=_count_subquery(Post.objects, 'author'),
+        real_followers=_count_subquery(Follow.objects, 'author'),
+        real_following=_count_subquery(Follow.objects, 'user'),
+        stored_posts=Coalesce('stats__posts_count', -1),
+        stored_followers=Coalesce('stats__followers_count', -1),
+        stored_following=Coalesce('stats__following_count', -1),
+    ).values_list(
+        'pk', 'real_posts', 'real_followers', 'real_following',
+        'stored_posts', 'stored_followers', 'stored_following',
+    )
+    fixed = 0
+    for pk, posts, followers, following, *stored in actual.iterator():
+        if stored == [posts, followers, following]:
+            continue
+        fixed += 1
+        if not dry_run:
+            UserStats.objects.update_or_create(user_id=pk, defaults={
+                'posts_count': posts,
+                'followers_count': followers,
+                'following_count': following,
+            })
+    return fixed
+
+
+def rebuild_comment_counts(dry_run=False):
+    """Чинит comments_count постов."""
+    actual = Post.objects.annotate(
+        real_comments=_count_subquery(Comment.objects, 'post'),
+    ).exclude(comments_count=F('real_comments')).values_list(
+        'pk', 'real_comments')
+    fixed = 0
+    for pk, comments in actual.iterator():
+        fixed += 1
+        if not dry_run:
+            Post.objects.filter(pk=pk).update(comments_count=comments)
+    return fixed
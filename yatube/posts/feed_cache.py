@@ -0,0 +1,164 @@
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Post
+
+GLOBAL_FEED = 'global'
+# Названия групп и имена авторов
+# есть на всех страницах лент.
+NAMES_FEED = 'names'
+
+# Шаг ожидания чужого пересчёта, с.
+LOCK_POLL_INTERVAL = 0.05
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def generation_key(feed):
+    return f'feed_gen:{feed}'
+
+
+def bump(*feeds):
+    """Сдвигает поколения лент."""
+    token = new_token()
+    cache.set_many(
+        {generation_key(feed): token for feed in feeds if feed},
+        timeout=None,
+    )
+
+
+def new_token():
+    """Время сдвига и случайная часть."""
+    return f'{time.time():.6f}-{uuid.uuid4().hex}'
+
+
+def version_time(version):
+    """Время последнего сдвига."""
+    stamps = []
+    for token in version.split(':'):
+        try:
+            stamps.append(float(token.partition('-')[0]))
+        except ValueError:
+            # Токен без времени: сейчас.
+            stamps.append(time.time())
+    return datetime.fromtimestamp(max(stamps), timezone.utc)
+
+
+def get_version(*feeds):
+    """Версия набора лент."""
+    keys = [generation_key(feed) for feed in feeds]
+    generations = cache.get_many(keys)
+    missing = {key: new_token() for key in keys
+               if key not in generations}
+    for key, token in missing.items():
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key, token)
+        generations[key] = token
+    return ':'.join(generations[key] for key in keys)
+
+
+def feed_validators(request, newest, *feeds, extra=''):
+    """ETag и Last-Modified ленты."""
+    version = get_version(NAMES_FEED, *feeds)
+    newest_stamp = newest.isoformat() if newest else ''
+    raw = f'{version}|{newest_stamp}|{request.get_full_path()}|{extra}'
+    last_modified = max(filter(None, (newest, version_time(version))))
+    return hashlib.md5(raw.encode()).hexdigest(), last_modified
+
+
+def entry_key(feed, paginator, after, before):
+    """Ключ страницы по ключу курсора."""
+    after_key = paginator.decode_cursor(after)
+    before_key = None if after_key else paginator.decode_cursor(before)
+    for direction, key in (('after', after_key), ('before', before_key)):
+        if key is not None:
+            pub_date, pk = key
+            return f'feed:{feed}:{direction}:{pub_date.isoformat()}:{pk}'
+    return f'feed:{feed}:first'
+
+
+def get_feed_page(request, paginator, feed, *depends_on):
+    """Страница ленты, single-flight."""
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    version = get_version(feed, *depends_on)
+    key = entry_key(feed, paginator, after, before)
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is None:
+        if cache.add(lock_key, 1, settings.FEED_LOCK_TIME):
+            return compute_locked(
+                paginator, key, lock_key, version, after, before)
+        entry = wait_for_entry(key)
+        if entry is None:
+            return compute_page(paginator, key, version, after, before)
+    fresh = (
+        entry['version'] == version
+        and entry['fresh_until'] > time.time()
+    )
+    if fresh or not cache.add(lock_key, 1, settings.FEED_LOCK_TIME):
+        page_obj = build_page(paginator, entry)
+        if page_obj is not None:
+            # Старое поколение: без ETag.
+            request.stale_page = entry['version'] != version
+            return page_obj
+        return compute_page(paginator, key, version, after, before)
+    return compute_locked(paginator, key, lock_key, version, after, before)
+
+
+def wait_for_entry(key):
+    """Ждёт запись владельца блокировки."""
+    deadline = time.monotonic() + settings.FEED_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def compute_locked(paginator, key, lock_key, version, after, before):
+    try:
+        return compute_page(paginator, key, version, after, before)
+    finally:
+        cache.delete(lock_key)
+
+
+def compute_page(paginator, key, version, after, before):
+    page_obj = paginator.get_page(after=after, before=before)
+    cache.set(key, {
+        'version': version,
+        'fresh_until': time.time() + settings.FEED_CACHE_FRESH_TIME,
+        'ids': [post.id for post in page_obj],
+        'has_next': page_obj.has_next(),
+        'has_previous': page_obj.has_previous(),
+    }, settings.FEED_CACHE_TIME)
+    return page_obj
+
+
+def build_page(paginator, entry):
+    """Страница по id или None."""
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        entry['ids'])
+    if len(posts) != len(entry['ids']):
+        return None
+    return paginator.build_page(
+        [posts[pk] for pk in entry['ids']],
+        entry['has_next'],
+        entry['has_previous'],
+    )
@@ -0,0 +1,47 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_version(post):
+    """Хэш всего, что есть в карточке."""
+    group = post.group
+    parts = (
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        str(post.variants_ready),
+        post.author.username,
+        post.author.get_full_name(),
+        group.slug if group else '',
+        group.title if group else '',
+    )
+    return hashlib.md5('\x1f'.join(parts).encode()).hexdigest()
+
+
+def card_key(post):
+    return f'post_card:{post.id}:{card_version(post)}'
+
+
+def render_cards(posts):
+    """HTML карточек одним get_many."""
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    stale = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards]
+    prefetch_related_objects(
+        [post for _, post in stale if post.variants_ready], 'variants')
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in stale
+    }
+    if missing:
+        cache.set_many(missing, settings.CARD_CACHE_TIME)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
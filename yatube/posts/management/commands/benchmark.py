@@ -0,0 +1,186 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import benchmark
+
+
+def names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон страниц '
+        'на синтетических данных: '
+        'rps и p50/p95/p99 по сценариям, '
+        'сравнение с базовой линией.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_SIZES.items():
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'Размер данных: {name} '
+                     f'(по умолчанию {default}; '
+                     'follows — подписок '
+                     'на пользователя, '
+                     'images — постов с картинкой).',
+            )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора данных '
+                 'и запросов.',
+        )
+        parser.add_argument(
+            '--scenarios',
+            type=names,
+            default=list(benchmark.SCENARIOS),
+            help='Сценарии через запятую: '
+                 + ', '.join(benchmark.SCENARIOS) + '.',
+        )
+        parser.add_argument(
+            '--driver',
+            type=names,
+            default=list(benchmark.DRIVERS),
+            help='Драйверы через запятую: '
+                 'client — тестовый клиент, '
+                 'http — HTTP-сервер (WSGI), '
+                 'asgi — ASGI-вход в цикле '
+                 'событий процесса.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Потоков, одновременно '
+                 'выполняющих запросы.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Разогревочных запросов '
+                 'на поток перед замером.',
+        )
+        parser.add_argument(
+            '--save',
+            metavar='NAME',
+            help='Сохранить отчёт '
+                 'как базовую линию NAME.',
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='NAME',
+            help='Сравнить с базовой линией NAME.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=settings.BENCHMARK_THRESHOLD,
+            help='Допустимое ухудшение p95 и rps, %%.',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Завершиться с ошибкой, '
+                 'если есть регрессии.',
+        )
+
+    def handle(self, *args, **options):
+        self.check_names(options['scenarios'], benchmark.SCENARIOS)
+        self.check_names(options['driver'], benchmark.DRIVERS)
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError(
+                'Нужен хотя бы один поток и запрос')
+        baseline = None
+        if options['compare']:
+            path = self.baseline_path(options['compare'])
+            if not os.path.exists(path):
+                raise CommandError(f'Нет базовой линии {path}')
+            baseline = benchmark.load_baseline(path)
+        sizes = {name: options[name] for name in benchmark.DEFAULT_SIZES}
+
+        with tempfile.TemporaryDirectory() as directory:
+            with benchmark.isolated(directory):
+                started = time.perf_counter()
+                benchmark.seed(sizes, options['seed'])
+                self.stdout.write(
+                    f'Данные созданы за '
+                    f'{time.perf_counter() - started:.1f} с: {sizes}')
+                results = self.run(options)
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'sizes': sizes,
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }
+        self.stdout.write(benchmark.format_table(results))
+        if baseline is not None:
+            self.compare(baseline, report, options)
+        if options['save']:
+            path = self.baseline_path(options['save'])
+            benchmark.save_baseline(path, report)
+            self.stdout.write(
+                f'Базовая линия сохранена: {path}')
+
+    def run(self, options):
+        data = benchmark.Dataset()
+        results = {}
+        for driver_name in options['driver']:
+            driver = benchmark.DRIVERS[driver_name]()
+            try:
+                results[driver_name] = benchmark.run(
+                    driver, options['scenarios'], data,
+                    options['requests'], options['concurrency'],
+                    options['warmup'], options['seed'])
+            except benchmark.ScenarioError as error:
+                raise CommandError(f'{driver_name}: {error}')
+            finally:
+                driver.close()
+        return results
+
+    def compare(self, baseline, report, options):
+        if (baseline['sizes'], baseline['concurrency']) != (
+                report['sizes'], report['concurrency']):
+            self.stdout.write(self.style.WARNING(
+                'Базовая линия снята на других '
+                'данных или числе потоков'))
+        lines, regressions = benchmark.compare(
+            baseline, report, options['threshold'])
+        for line in lines:
+            self.stdout.write(line)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+            return
+        message = f'Регрессии: {", ".join(regressions)}'
+        if options['fail_on_regression']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
+
+    def check_names(self, values, known):
+        unknown = sorted(set(values) - set(known))
+        if unknown:
+            raise CommandError(
+                f'Неизвестные имена: {", ".join(unknown)}; '
+                f'доступны: {", ".join(known)}')
+
+    def baseline_path(self, name):
+        return os.path.join(settings.BENCHMARK_DIR, f'{name}.json')
@@ -0,0 +1,106 @@
+import gzip
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters, media, search, timeline
+from posts.bulkload import BulkLoader, iter_fixture
+from posts.models import Comment, Follow, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстрая загрузка фикстур '
+        '(dumpdata или JSON Lines из '
+        'export_yatube, можно .gz) '
+        'пачками bulk_create '
+        'в одной транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures', nargs='+',
+            help='Пути к файлам фикстур.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Строк одной модели '
+                 'на запрос.',
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Пропускать строки, '
+                 'которые уже есть в базе.',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=10000,
+            help='Печатать скорость каждые '
+                 'N строк; 0 — только итог.',
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересчитывать счётчики, '
+                 'ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        progress_every = options['progress_every']
+        reported = 0
+
+        def progress(loader):
+            nonlocal reported
+            if progress_every and loader.total - reported >= progress_every:
+                reported = loader.total
+                self.stdout.write(
+                    f'{loader.total} строк, '
+                    f'{loader.rate:.0f} строк/с')
+
+        loader = BulkLoader(
+            options['batch_size'],
+            ignore_conflicts=options['ignore_conflicts'],
+            progress=progress,
+        )
+        try:
+            with ExitStack() as stack:
+                sources = []
+                for path in options['fixtures']:
+                    opener = gzip.open if path.endswith('.gz') else open
+                    stream = stack.enter_context(
+                        opener(path, 'rt', encoding='utf-8'))
+                    sources.append(iter_fixture(stream, path))
+                counts = loader.run(*sources)
+        except (OSError, ValueError) as error:
+            raise CommandError(
+                f'Фикстуры не загружены: {error}')
+        for model, count in counts.items():
+            self.stdout.write(f'  {model._meta.label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {loader.total} '
+            f'({loader.rate:.0f} строк/с)'
+        ))
+        if not options['skip_rebuild'] and {Post, Comment, Follow} & set(
+                counts):
+            self.rebuild()
+
+    def rebuild(self):
+        """Пересчитывает то, что обошёл bulk_create."""
+        with transaction.atomic():
+            counters.rebuild_user_stats()
+            timeline.promote()
+            counters.rebuild_comment_counts()
+            media.rebuild_refcounts()
+            for follow in Follow.objects.select_related('user', 'author'):
+                timeline.add_author(follow.user, follow.author)
+            if search.is_available():
+                search.rebuild(Post.objects.order_by())
+        cache.clear()
+        self.stdout.write(
+            'Счётчики, картинки, ленты '
+            'и поиск пересчитаны')
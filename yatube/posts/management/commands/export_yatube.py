@@ -0,0 +1,144 @@
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from posts.models import Comment, Follow, Group, Post
+
+# Модель и поле для выгрузки --since;
+# без поля модель выгружается целиком.
+EXPORTS = (
+    (Group, None),
+    (Post, 'pub_date'),
+    (Comment, 'created'),
+    (Follow, None),
+)
+
+
+def parse_since(value):
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f'Неверная дата: {value}')
+        since = parse_datetime(f'{date.isoformat()}T00:00:00')
+    return make_aware(since) if is_naive(since) else since
+
+
+def iter_records(model, since_field, since, chunk_size):
+    """Строки модели в формате dumpdata."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    queryset = model.objects.order_by('pk')
+    if since is not None and since_field is not None:
+        queryset = queryset.filter(**{f'{since_field}__gte': since})
+    rows = queryset.values_list(
+        'pk', *(field.attname for field in fields))
+    label = model._meta.label_lower
+    for pk, *values in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'model': label,
+            'pk': pk,
+            'fields': {
+                field.name: value for field, value in zip(fields, values)
+            },
+        }
+
+
+def export_model(model, since_field, options):
+    """Выгружает модель через .tmp-файл."""
+    since = options['since']
+    extension = '.jsonl.gz' if options['compress'] else '.jsonl'
+    path = os.path.join(
+        options['output'], model._meta.label_lower + extension)
+    opener = gzip.open if options['compress'] else open
+    started = time.monotonic()
+    count = 0
+    with opener(path + '.tmp', 'wt', encoding='utf-8') as stream:
+        for record in iter_records(
+                model, since_field, since, options['chunk_size']):
+            stream.write(json.dumps(
+                record, cls=DjangoJSONEncoder, ensure_ascii=False))
+            stream.write('\n')
+            count += 1
+    os.replace(path + '.tmp', path)
+    return path, count, time.monotonic() - started
+
+
+def export_in_worker(export, options):
+    try:
+        return export_model(*export, options)
+    finally:
+        # У потока своё соединение с БД.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка групп, постов, '
+        'комментариев и подписок '
+        'в JSON Lines, файл на модель.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='export',
+            help='Каталог для файлов выгрузки.',
+        )
+        parser.add_argument(
+            '--since',
+            help='Только посты и комментарии '
+                 'с этого момента (ISO-дата '
+                 'или дата и время).',
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='Сжимать файлы gzip.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Строк из курсора БД за раз.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Моделей параллельно.',
+        )
+
+    def handle(self, *args, **options):
+        if options['since']:
+            options['since'] = parse_since(options['since'])
+        os.makedirs(options['output'], exist_ok=True)
+        workers = max(1, min(options['workers'], len(EXPORTS)))
+        if workers == 1:
+            results = [
+                export_model(model, since_field, options)
+                for model, since_field in EXPORTS
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(
+                    lambda export: export_in_worker(export, options),
+                    EXPORTS))
+        total = 0
+        for path, count, elapsed in results:
+            total += count
+            rate = count / elapsed if elapsed else 0
+            self.stdout.write(
+                f'  {path}: {count} строк, {rate:.0f} строк/с')
+        self.stdout.write(
+            self.style.SUCCESS(f'Выгружено строк: {total}'))
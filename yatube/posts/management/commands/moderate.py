@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import moderation
+from posts.models import Group, ModerationJob, Post, User
+
+ACTIONS = {
+    'regroup': ModerationJob.REGROUP,
+    'delete-posts': ModerationJob.DELETE_POSTS,
+    'delete-author': ModerationJob.DELETE_AUTHOR,
+    'purge-comments': ModerationJob.PURGE_COMMENTS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовая модерация пачками '
+        'UPDATE/DELETE: перенос постов, '
+        'удаление постов, автора '
+        'и комментариев.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=[*ACTIONS, 'run-pending'],
+            help='Действие; run-pending '
+                 'выполняет очередь заданий.',
+        )
+        parser.add_argument(
+            '--posts',
+            help='id постов через запятую.',
+        )
+        parser.add_argument(
+            '--from-group',
+            help='Все посты группы slug.',
+        )
+        parser.add_argument(
+            '--author',
+            help='Имя автора: его посты '
+                 'или, для delete-author, '
+                 'всё, что он написал.',
+        )
+        parser.add_argument(
+            '--group',
+            help='slug группы для переноса '
+                 '(без него — убрать '
+                 'из групп).',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Поставить в очередь '
+                 'и не ждать.',
+        )
+
+    def handle(self, *args, **options):
+        if options['action'] == 'run-pending':
+            self.run_pending()
+            return
+        action = ACTIONS[options['action']]
+        params = self.build_params(action, options)
+        if options['background']:
+            job = moderation.submit(action, params)
+            self.stdout.write(
+                f'Задание №{job.pk} в очереди')
+            return
+        done = moderation.run(action, params, progress=self.progress)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано записей: {done}'))
+
+    def progress(self, done, total):
+        self.stdout.write(f'  {done}/{total}')
+
+    def build_params(self, action, options):
+        if action == ModerationJob.DELETE_AUTHOR:
+            return {'author_ids': [self.get_author(options).id]}
+        ranges, _ = moderation.id_ranges(self.select_posts(options))
+        params = {'post_ranges': ranges}
+        if action == ModerationJob.REGROUP:
+            params['group_id'] = None
+            if options['group']:
+                params['group_id'] = self.get_group(options['group']).id
+        return params
+
+    def select_posts(self, options):
+        posts = Post.objects.all()
+        if options['posts']:
+            try:
+                ids = [int(pk) for pk in options['posts'].split(',')]
+            except ValueError:
+                raise CommandError('--posts: нужны числовые id')
+            posts = posts.filter(id__in=ids)
+        elif options['from_group']:
+            posts = posts.filter(group=self.get_group(options['from_group']))
+        elif options['author']:
+            posts = posts.filter(author=self.get_author(options))
+        else:
+            raise CommandError(
+                'Укажите --posts, --from-group '
+                'или --author')
+        return posts
+
+    def get_group(self, slug):
+        try:
+            return Group.objects.get(slug=slug)
+        except Group.DoesNotExist:
+            raise CommandError(f'Группа {slug} не найдена')
+
+    def get_author(self, options):
+        if not options['author']:
+            raise CommandError('Укажите --author')
+        try:
+            return User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Нет пользователя {options["author"]}')
+
+    def run_pending(self):
+        moderation.requeue_abandoned()
+        job_ids = list(ModerationJob.objects.filter(
+            status=ModerationJob.PENDING,
+        ).order_by('id').values_list('id', flat=True))
+        for job_id in job_ids:
+            moderation.run_job(job_id)
+            job = ModerationJob.objects.get(pk=job_id)
+            self.stdout.write(
+                f'Задание №{job_id}: '
+                f'{job.get_status_display()}')
@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.models import ThumbnailJob
+from posts.thumbnails import process, requeue_abandoned, run_in_worker
+
+# Версии картинок: миниатюры не нужны.
+SKIP_DIRECTORIES = {'variants'}
+
+
+def walk_storage(path):
+    directories, files = default_storage.listdir(path)
+    for name in files:
+        if not name.endswith('.upload'):
+            yield os.path.join(path, name)
+    for directory in directories:
+        if directory not in SKIP_DIRECTORIES:
+            yield from walk_storage(os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь миниатюры '
+        'картинок media/posts/ '
+        'и разбирает очередь.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Число потоков; 0 — '
+                 'в текущем потоке.',
+        )
+        parser.add_argument(
+            '--path',
+            default='posts',
+            help='Каталог хранилища.',
+        )
+        parser.add_argument(
+            '--skip-scan',
+            action='store_true',
+            help='Не сканировать файлы, '
+                 'только разобрать очередь.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_scan']:
+            known = set(ThumbnailJob.objects.values_list('image', flat=True))
+            new_jobs = [
+                ThumbnailJob(image=name)
+                for name in walk_storage(options['path'])
+                if name not in known
+            ]
+            ThumbnailJob.objects.bulk_create(new_jobs, batch_size=500)
+            self.stdout.write(f'Новых заданий: {len(new_jobs)}')
+        requeued = requeue_abandoned()
+        if requeued:
+            self.stdout.write(
+                f'Брошенных в очереди: {requeued}')
+        images = list(ThumbnailJob.objects.filter(
+            Q(status=ThumbnailJob.PENDING)
+            | Q(status=ThumbnailJob.FAILED,
+                attempts__lt=settings.THUMBNAIL_MAX_ATTEMPTS),
+        ).values_list('image', flat=True))
+        if options['workers']:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            results = pool.map(run_in_worker, images)
+        else:
+            pool = None
+            results = map(process, images)
+        for done, _ in enumerate(results, 1):
+            if done % 100 == 0:
+                self.stdout.write(
+                    f'Обработано {done} из {len(images)}')
+        if pool is not None:
+            pool.shutdown()
+        failed = ThumbnailJob.objects.filter(
+            status=ThumbnailJob.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(images)}, '
+            f'с ошибками: {failed}'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_comment_counts, rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число '
+                 'расхождений.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        users = rebuild_user_stats(dry_run=dry_run)
+        posts = rebuild_comment_counts(dry_run=dry_run)
+        action = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: '
+            f'пользователей {users}, постов {posts}'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс FTS5.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Постов в индекс за раз.',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('FTS5 есть только в SQLite.')
+        with transaction.atomic():
+            total = search.rebuild(
+                Post.objects.order_by(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {total}'))
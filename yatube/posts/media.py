@@ -0,0 +1,62 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from . import thumbnails
+from .models import MediaBlob, Post
+from .storage import is_content_addressed
+
+
+def acquire(name):
+    """+1 ссылка на файл."""
+    if not is_content_addressed(name):
+        return
+    if MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        MediaBlob.objects.filter(name=name).update(
+            refcount=F('refcount') + 1)
+
+
+def release(name, count=1):
+    """-count ссылок; 0 удаляет файл."""
+    # Файлы до хэширования не трогаем.
+    if not is_content_addressed(name):
+        return
+    MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+        refcount=Greatest(F('refcount') - count, 0))
+    deleted, _ = MediaBlob.objects.filter(name=name, refcount=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: remove_files(name))
+
+
+def remove_files(name):
+    thumbnails.discard(name)
+    Post.image.field.storage.delete(name)
+
+
+def rebuild_refcounts():
+    """Пересчитывает MediaBlob."""
+    actual = {
+        name: count
+        for name, count in Post.objects.exclude(image='').order_by()
+        .values('image').annotate(total=Count('pk'))
+        .values_list('image', 'total').iterator()
+        if is_content_addressed(name)
+    }
+    stored = dict(MediaBlob.objects.values_list('name', 'refcount'))
+    fixed = 0
+    for name, count in actual.items():
+        if stored.get(name) == count:
+            continue
+        fixed += 1
+        MediaBlob.objects.update_or_create(
+            name=name, defaults={'refcount': count})
+    orphaned = set(stored) - set(actual)
+    if orphaned:
+        fixed += len(orphaned)
+        MediaBlob.objects.filter(name__in=orphaned).delete()
+    return fixed
@@ -4,6 +4,8 @@ from django.conf import settings
 
 from core.models import CreatedModel
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -37,7 +39,8 @@ class Post(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group,
@@ -46,22 +49,61 @@ class Post(models.Model):
         null=True,
         related_name='posts',
         verbose_name='Группа',
-        help_text='Выберете группу'
+        help_text='Выберете группу',
+        db_index=False,
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+    variants_ready = models.BooleanField(
+        'Адаптивные версии картинки готовы',
+        default=False,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты читаются по индексу в
+        # порядке курсора (pub_date, id).
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:settings.COUNT_WORD]
 
+    def save(self, *args, **kwargs):
+        # comments_count меняют только UPDATE
+        # с F(): устаревший экземпляр его
+        # не перезаписывает.
+        if not self._state.adding and not kwargs.get('force_insert'):
+            fields = kwargs.get('update_fields')
+            if fields is None:
+                fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                ]
+            kwargs['update_fields'] = [
+                name for name in fields if name != 'comments_count']
+        super().save(*args, **kwargs)
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -69,6 +111,7 @@ class Comment(CreatedModel):
         on_delete=models.CASCADE,
         related_name='comments',
         verbose_name='Комментируемый пост',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -85,6 +128,12 @@ class Comment(CreatedModel):
         ordering = ['-created']
         verbose_name = 'Комментарий '
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -99,13 +148,220 @@ class Follow(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='following'
+        related_name='following',
+        db_index=False,
     )
 
     class Meta:
+        # Покрывающий индекс подписчиков.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_follow'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        'Число подписок', default=0)
+    celebrity = models.BooleanField(
+        'Посты подмешиваются при чтении',
+        default=False,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class ThumbnailJob(models.Model):
+    """Задание генерации миниатюр."""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    image = models.CharField(
+        'Файл картинки', max_length=255, unique=True)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Генерация миниатюр'
+        verbose_name_plural = 'Генерация миниатюр'
+
+    def __str__(self):
+        return f'{self.image} ({self.status})'
+
+
+class ImageVariant(models.Model):
+    """Версия картинки для srcset."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='variants',
+        verbose_name='Пост',
+    )
+    file = models.FileField('Файл', max_length=255)
+    format = models.CharField('Формат', max_length=16)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    size = models.PositiveIntegerField('Размер, байт')
+
+    class Meta:
+        ordering = ('width',)
+        verbose_name = 'Версия картинки'
+        verbose_name_plural = 'Версии картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_variant'
+            )
+        ]
+
+    @property
+    def mime_type(self):
+        return f'image/{self.format}'
+
+
+class MediaBlob(models.Model):
+    """Число постов с этим файлом."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(
+        'Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class ModerationJob(models.Model):
+    """Задание массовой модерации."""
+    REGROUP = 'regroup'
+    DELETE_POSTS = 'delete_posts'
+    DELETE_COMMENTS = 'delete_comments'
+    DELETE_AUTHOR = 'delete_author'
+    PURGE_COMMENTS = 'purge_comments'
+    ACTION_CHOICES = (
+        (REGROUP, 'Перенос постов в группу'),
+        (DELETE_POSTS, 'Удаление постов'),
+        (DELETE_COMMENTS, 'Удаление комментариев'),
+        (DELETE_AUTHOR,
+         'Удаление постов и комментариев '
+         'автора'),
+        (PURGE_COMMENTS,
+         'Очистка комментариев постов'),
+    )
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    action = models.CharField(
+        'Действие', max_length=32, choices=ACTION_CHOICES)
+    params = models.TextField('Параметры (JSON)')
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    total = models.PositiveIntegerField('Всего', default=0)
+    done = models.PositiveIntegerField('Обработано', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Задание модерации'
+        verbose_name_plural = 'Задания модерации'
+
+    def __str__(self):
+        return f'{self.get_action_display()}: {self.done}/{self.total}'
@@ -0,0 +1,247 @@
+"""Массовая модерация пачками UPDATE/DELETE.
+
+Сигналы не срабатывают: счётчики,
+индекс и ленты операции правят сами.
+"""
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, feed_cache, media, search
+from .models import (
+    Comment, ImageVariant, ModerationJob, Post, TimelineEntry,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MODERATION_WORKERS,
+                thread_name_prefix='moderation',
+            )
+    return _executor
+
+
+def chunked(ids):
+    size = settings.MODERATION_CHUNK_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def raw_delete(queryset):
+    """DELETE без каскадов и сигналов."""
+    return queryset._raw_delete(queryset.db)
+
+
+def bump_on_commit(feeds):
+    transaction.on_commit(lambda: feed_cache.bump(*feeds))
+
+
+def post_feeds(rows):
+    """Ленты постов (author, group)."""
+    feeds = {feed_cache.GLOBAL_FEED}
+    for author_id, group_id in rows:
+        feeds.add(feed_cache.author_feed(author_id))
+        if group_id:
+            feeds.add(feed_cache.group_feed(group_id))
+    return feeds
+
+
+def regroup_posts(post_ids, group_id):
+    """Переносит посты в группу."""
+    for chunk in chunked(post_ids):
+        with transaction.atomic():
+            posts = Post.objects.filter(id__in=chunk)
+            feeds = post_feeds(
+                posts.values_list('author_id', 'group_id').distinct())
+            if group_id:
+                feeds.add(feed_cache.group_feed(group_id))
+            posts.update(group_id=group_id)
+            bump_on_commit(feeds)
+        yield len(chunk)
+
+
+def delete_posts(post_ids):
+    """Удаляет посты с зависимыми."""
+    for chunk in chunked(post_ids):
+        with transaction.atomic():
+            rows = list(Post.objects.filter(id__in=chunk).values_list(
+                'id', 'author_id', 'group_id', 'image'))
+            ids = [row[0] for row in rows]
+            raw_delete(Comment.objects.filter(post_id__in=ids))
+            raw_delete(TimelineEntry.objects.filter(post_id__in=ids))
+            raw_delete(ImageVariant.objects.filter(post_id__in=ids))
+            raw_delete(Post.objects.filter(id__in=ids))
+            authors = Counter(author_id for _, author_id, _, _ in rows)
+            for author_id, count in authors.items():
+                counters.bump_user(author_id, posts_count=-count)
+            images = Counter(image for *_, image in rows if image)
+            for name, count in images.items():
+                media.release(name, count)
+            search.unindex_posts(ids)
+            bump_on_commit(post_feeds(
+                (author_id, group_id) for _, author_id, group_id, _ in rows))
+        yield len(chunk)
+
+
+def delete_comments(comment_ids):
+    """Удаляет комментарии."""
+    for chunk in chunked(comment_ids):
+        with transaction.atomic():
+            comments = Comment.objects.filter(id__in=chunk)
+            post_ids = set(comments.values_list('post_id', flat=True))
+            raw_delete(comments)
+            counters.recount_comments(post_ids)
+        yield len(chunk)
+
+
+def id_ranges(queryset):
+    """Диапазоны id выборки и её размер."""
+    ranges = []
+    count = 0
+    for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator():
+        count += 1
+        if ranges and ranges[-1][1] == pk - 1:
+            ranges[-1][1] = pk
+        else:
+            ranges.append([pk, pk])
+    return ranges, count
+
+
+def selection(model, params, name):
+    """id из name_ids или name_ranges."""
+    ranges = params.get(f'{name}_ranges')
+    if ranges is None:
+        return params[f'{name}_ids']
+    # Диапазон — два параметра запроса.
+    size = settings.MODERATION_CHUNK_SIZE // 2
+    ids = []
+    for start in range(0, len(ranges), size):
+        condition = Q()
+        for first, last in ranges[start:start + size]:
+            condition |= Q(pk__range=(first, last))
+        ids += model.objects.filter(condition).order_by('pk').values_list(
+            'pk', flat=True)
+    return ids
+
+
+def comments_of_posts(post_ids):
+    ids = []
+    for chunk in chunked(post_ids):
+        ids += Comment.objects.filter(post_id__in=chunk).values_list(
+            'id', flat=True)
+    return ids
+
+
+def author_content(author_ids):
+    """id комментариев и постов авторов."""
+    comment_ids = list(Comment.objects.filter(
+        Q(author_id__in=author_ids) | Q(post__author_id__in=author_ids)
+    ).values_list('id', flat=True))
+    post_ids = list(Post.objects.filter(
+        author_id__in=author_ids).values_list('id', flat=True))
+    return comment_ids, post_ids
+
+
+def plan(action, params):
+    """(всего записей, генератор пачек)."""
+    if action == ModerationJob.REGROUP:
+        post_ids = selection(Post, params, 'post')
+        return len(post_ids), regroup_posts(post_ids, params['group_id'])
+    if action == ModerationJob.DELETE_POSTS:
+        post_ids = selection(Post, params, 'post')
+        comment_ids = comments_of_posts(post_ids)
+    elif action == ModerationJob.DELETE_COMMENTS:
+        comment_ids = selection(Comment, params, 'comment')
+        post_ids = []
+    elif action == ModerationJob.DELETE_AUTHOR:
+        comment_ids, post_ids = author_content(params['author_ids'])
+    elif action == ModerationJob.PURGE_COMMENTS:
+        post_ids = selection(Post, params, 'post')
+        comment_ids, post_ids = comments_of_posts(post_ids), []
+    else:
+        raise ValueError(f'Неизвестное действие: {action}')
+
+    def steps():
+        yield from delete_comments(comment_ids)
+        yield from delete_posts(post_ids)
+
+    return len(comment_ids) + len(post_ids), steps()
+
+
+def run(action, params, progress=None):
+    """Выполняет действие сейчас."""
+    total, steps = plan(action, params)
+    done = 0
+    for count in steps:
+        done += count
+        if progress is not None:
+            progress(done, total)
+    return done
+
+
+def submit(action, params):
+    """Ставит действие в очередь."""
+    job = ModerationJob.objects.create(
+        action=action, params=json.dumps(params))
+    if settings.MODERATION_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_worker, job.pk))
+    else:
+        run_job(job.pk)
+    return job
+
+
+def run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_job(job_id):
+    """Выполняет незанятое задание."""
+    jobs = ModerationJob.objects.filter(pk=job_id)
+    claimed = jobs.filter(status=ModerationJob.PENDING).update(
+        status=ModerationJob.PROCESSING, updated=timezone.now())
+    if not claimed:
+        return
+    job = jobs.get()
+
+    def progress(done, total):
+        jobs.update(done=done, total=total, updated=timezone.now())
+
+    try:
+        run(job.action, json.loads(job.params), progress)
+    except Exception as error:
+        logger.exception('Задание %s не выполнено', job_id)
+        jobs.update(
+            status=ModerationJob.FAILED, error=str(error),
+            updated=timezone.now())
+        return
+    jobs.update(status=ModerationJob.DONE, updated=timezone.now())
+
+
+def requeue_abandoned():
+    """Возвращает брошенные задания."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.MODERATION_LEASE_TIMEOUT)
+    return ModerationJob.objects.filter(
+        status=ModerationJob.PROCESSING, updated__lt=deadline,
+    ).update(status=ModerationJob.PENDING, updated=timezone.now())
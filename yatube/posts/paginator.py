@@ -0,0 +1,132 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(key):
+    """Курсор из ключа (pub_date, id)."""
+    pub_date, pk = key
+    raw = f'{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Ключ курсора или None."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def fetch_window(queryset, key_fields, after_key, before_key, limit):
+    """До limit строк за курсором и has_more."""
+    pub_field, id_field = key_fields
+    if after_key is not None:
+        pub_date, pk = after_key
+        queryset = queryset.filter(
+            Q(**{f'{pub_field}__lt': pub_date})
+            | Q(**{pub_field: pub_date, f'{id_field}__lt': pk})
+        ).order_by(f'-{pub_field}', f'-{id_field}')
+    elif before_key is not None:
+        pub_date, pk = before_key
+        queryset = queryset.filter(
+            Q(**{f'{pub_field}__gt': pub_date})
+            | Q(**{pub_field: pub_date, f'{id_field}__gt': pk})
+        ).order_by(pub_field, id_field)
+    else:
+        queryset = queryset.order_by(f'-{pub_field}', f'-{id_field}')
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_key is not None:
+        rows.reverse()
+    return rows, has_more
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id)."""
+    is_cursor = True
+    key_fields = ('pub_date', 'id')
+    next_cursor = None
+    previous_cursor = None
+
+    def get_key(self, obj):
+        # Строки values() приходят словарями.
+        if isinstance(obj, dict):
+            return tuple(obj[field] for field in self.key_fields)
+        return tuple(getattr(obj, field) for field in self.key_fields)
+
+    def encode_cursor(self, key):
+        return encode_cursor(key)
+
+    def decode_cursor(self, cursor):
+        return decode_cursor(cursor)
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def get_page(self, after=None, before=None):
+        after_key = self.decode_cursor(after)
+        before_key = None if after_key else self.decode_cursor(before)
+        rows, has_more = self.fetch(after_key, before_key, self.per_page)
+        if before_key is not None:
+            if not rows:
+                return self.get_page()
+            return self.build_page(rows, True, has_more)
+        return self.build_page(rows, has_more, after_key is not None)
+
+    def get_legacy_page(self, number):
+        """?page=N не глубже LEGACY_PAGE_LIMIT."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        number = min(number, settings.LEGACY_PAGE_LIMIT)
+        offset = (number - 1) * self.per_page
+        ordering = [f'-{field}' for field in self.key_fields]
+        rows = list(self.object_list.order_by(*ordering)[
+            offset:offset + self.per_page + 1])
+        if not rows and offset:
+            return self.get_page()
+        return self.build_page(
+            rows[:self.per_page], len(rows) > self.per_page, offset > 0)
+
+    def build_page(self, rows, has_next, has_previous):
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        if has_next:
+            self.next_cursor = self.encode_cursor(self.get_key(rows[-1]))
+        if has_previous:
+            self.previous_cursor = self.encode_cursor(self.get_key(rows[0]))
+        return Page(rows, number, self)
+
+    def fetch(self, after_key, before_key, limit):
+        return fetch_window(
+            self.object_list, self.key_fields, after_key, before_key, limit)
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии по (created, id)."""
+    key_fields = ('created', 'id')
+
+
+class CappedCountPaginator(Paginator):
+    """COUNT(*) не дальше ADMIN_COUNT_LIMIT."""
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
@@ -0,0 +1,157 @@
+import base64
+import binascii
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginator import CursorPaginator
+from .stemmer import normalize
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def is_available():
+    """FTS5 есть только в SQLite."""
+    return connection.vendor == 'sqlite'
+
+
+def index_document(post):
+    return ' '.join(normalize(post.text))
+
+
+def match_expression(query):
+    """MATCH по основам в кавычках."""
+    terms = dict.fromkeys(normalize(query))
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, body) '
+            'VALUES (%s, %s)',
+            [post.id, index_document(post)],
+        )
+
+
+def unindex_post(post_id):
+    unindex_posts([post_id])
+
+
+def unindex_posts(post_ids):
+    if not is_available() or not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            list(post_ids))
+
+
+def rebuild(posts, batch_size=1000):
+    """Перестраивает индекс; число постов."""
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        for post_id, text in posts.values_list('id', 'text').iterator(
+                chunk_size=batch_size):
+            batch.append((post_id, ' '.join(normalize(text))))
+            if len(batch) == batch_size:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE}(rowid, body) VALUES (%s, %s)',
+                    batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, body) VALUES (%s, %s)',
+                batch)
+            total += len(batch)
+    return total
+
+
+def filter_posts(queryset, query):
+    """Посты по запросу, без ранга."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset
+    if not is_available():
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [expression],
+    ))
+
+
+def get_paginator(query, per_page):
+    if is_available():
+        return SearchPaginator(query, per_page)
+    return CursorPaginator(
+        Post.objects.select_related('author', 'group').filter(
+            text__icontains=query),
+        per_page,
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Поиск по bm25, курсор (ранг, id)."""
+    key_fields = ('search_rank', 'id')
+
+    def __init__(self, query, per_page, **kwargs):
+        self.expression = match_expression(query)
+        posts = Post.objects.select_related('author', 'group')
+        super().__init__(posts, per_page, **kwargs)
+
+    def encode_cursor(self, key):
+        rank, pk = key
+        raw = f'{rank!r}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            rank, pk = raw.decode().split('|')
+            return float(rank), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+
+    def fetch(self, after_key, before_key, limit):
+        if not self.expression:
+            return [], False
+        rank = f'bm25({FTS_TABLE})'
+        where = [f'{FTS_TABLE} MATCH %s']
+        params = [self.expression]
+        order = 'ASC'
+        if after_key is not None:
+            where.append(f'({rank} > %s OR ({rank} = %s AND rowid > %s))')
+            params += [after_key[0], after_key[0], after_key[1]]
+        elif before_key is not None:
+            where.append(f'({rank} < %s OR ({rank} = %s AND rowid < %s))')
+            params += [before_key[0], before_key[0], before_key[1]]
+            order = 'DESC'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, {rank} FROM {FTS_TABLE} '
+                f'WHERE {" AND ".join(where)} '
+                f'ORDER BY {rank} {order}, rowid {order} LIMIT %s',
+                params + [limit + 1],
+            )
+            rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before_key is not None:
+            rows.reverse()
+        posts = self.object_list.in_bulk([post_id for post_id, _ in rows])
+        results = []
+        for post_id, search_rank in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.search_rank = search_rank
+                results.append(post)
+        return results, has_more
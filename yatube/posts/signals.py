@@ -0,0 +1,114 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, media, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance._old_names = None
+    if instance.pk and (
+            update_fields is None or set(NAME_FIELDS) & set(update_fields)):
+        instance._old_names = User.objects.filter(
+            pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        return
+    old_names = getattr(instance, '_old_names', None)
+    names = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if old_names is not None and old_names != names:
+        feed_cache.bump(feed_cache.NAMES_FEED)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    feed_cache.bump(feed_cache.NAMES_FEED)
+
+
+def bump_post_feeds(post, *extra_feeds):
+    feed_cache.bump(
+        feed_cache.GLOBAL_FEED,
+        feed_cache.author_feed(post.author_id),
+        post.group_id and feed_cache.group_feed(post.group_id),
+        *extra_feeds,
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance._old_group_id = None
+    instance._old_image = ''
+    if instance.pk:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if old is not None:
+            instance._old_group_id, instance._old_image = old
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index_post(instance)
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        media.acquire(instance.image.name)
+        follower_ids = timeline.fan_out_post(instance)
+        bump_post_feeds(instance, *map(feed_cache.follow_feed, follower_ids))
+        return
+    old_image = getattr(instance, '_old_image', instance.image.name)
+    if old_image != instance.image.name:
+        media.acquire(instance.image.name)
+        media.release(old_image)
+    old_group_id = getattr(instance, '_old_group_id', None)
+    follower_ids = timeline.get_follower_ids(instance.author_id)
+    bump_post_feeds(
+        instance,
+        old_group_id and feed_cache.group_feed(old_group_id),
+        *map(feed_cache.follow_feed, follower_ids),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    media.release(instance.image.name)
+    search.unindex_post(instance.id)
+    follower_ids = timeline.get_follower_ids(instance.author_id)
+    bump_post_feeds(instance, *map(feed_cache.follow_feed, follower_ids))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+        timeline.promote(instance.author_id)
+        timeline.add_author(instance.user, instance.author)
+        feed_cache.bump(feed_cache.follow_feed(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, following_count=-1)
+    counters.bump_user(instance.author_id, followers_count=-1)
+    timeline.remove_author(instance.user, instance.author)
+    timeline.schedule_demotion(instance.author_id)
+    feed_cache.bump(feed_cache.follow_feed(instance.user_id))
@@ -0,0 +1,105 @@
+"""Русский стеммер Snowball для поиска."""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+# Флаг: окончание после а или я.
+PERFECTIVE_GERUND = (
+    [(ending, True) for ending in ('в', 'вши', 'вшись')]
+    + [(ending, False) for ending in (
+        'ив', 'ивши', 'ившись', 'ыв', 'ывши',
+        'ывшись')]
+)
+ADJECTIVE = [(ending, False) for ending in (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+    'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему',
+    'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')]
+PARTICIPLE = (
+    [(ending, True) for ending in ('ем', 'нн', 'вш', 'ющ', 'щ')]
+    + [(ending, False) for ending in ('ивш', 'ывш', 'ующ')]
+)
+REFLEXIVE = [('ся', False), ('сь', False)]
+VERB = (
+    [(ending, True) for ending in (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н',
+        'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно')]
+    + [(ending, False) for ending in (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите',
+        'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым',
+        'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+        'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю')]
+)
+NOUN = [(ending, False) for ending in (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами',
+    'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям',
+    'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях',
+    'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я')]
+DERIVATIONAL = [('ост', False), ('ость', False)]
+SUPERLATIVE = [('ейш', False), ('ейше', False)]
+
+
+def region_start(word, start=0):
+    """Начало области RV/R1/R2."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def strip_ending(region, endings):
+    """Отрезает самое длинное окончание."""
+    for ending, after_a in sorted(endings, key=lambda item: -len(item[0])):
+        if not region.endswith(ending):
+            continue
+        rest = region[:-len(ending)]
+        if after_a and not rest.endswith(('а', 'я')):
+            return region, False
+        return rest, True
+    return region, False
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        len(word))
+    r2_start = region_start(word, region_start(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    rv, found = strip_ending(rv, PERFECTIVE_GERUND)
+    if not found:
+        rv, _ = strip_ending(rv, REFLEXIVE)
+        rv, found = strip_ending(rv, ADJECTIVE)
+        if found:
+            rv, _ = strip_ending(rv, PARTICIPLE)
+        else:
+            rv, found = strip_ending(rv, VERB)
+            if not found:
+                rv, _ = strip_ending(rv, NOUN)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    for ending, _ in DERIVATIONAL[::-1]:
+        if (rv.endswith(ending)
+                and rv_start + len(rv) - len(ending) >= r2_start):
+            rv = rv[:-len(ending)]
+            break
+
+    rv, found = strip_ending(rv, SUPERLATIVE)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif not found and rv.endswith('ь'):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def normalize(text):
+    """Слова текста, русские — основы."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [
+        stem(word) if CYRILLIC_RE.search(word) else word
+        for word in words
+    ]
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_NAME_RE = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+# mkstemp даёт 0600; файлу нужны
+# 0666 & ~umask, как в FileSystemStorage.
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def is_content_addressed(name):
+    return bool(name) and HASH_NAME_RE.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы под sha256: posts/ab/cd/<хэш>.png."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=full_directory, suffix='.upload')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = '/'.join(filter(None, (
+                directory, hexdigest[:2], hexdigest[2:4],
+                hexdigest + extension,
+            )))
+            if self.exists(name):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+                os.replace(temp_path, self.path(name))
+                mode = self.file_permissions_mode
+                if mode is None:
+                    mode = 0o666 & ~UMASK
+                os.chmod(self.path(name), mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
@@ -0,0 +1,32 @@
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+STREAM_MARKER = '<!-- stream -->'
+
+
+def render_streaming(request, template_name, context, name, rows,
+                     rows_template):
+    """Отдаёт длинный список потоком."""
+    html = render_to_string(
+        template_name,
+        {**context, name: None, 'stream_marker': mark_safe(STREAM_MARKER)},
+        request,
+    )
+    head, tail = html.split(STREAM_MARKER, 1)
+    rows_template = get_template(rows_template)
+
+    def chunks():
+        yield head
+        rows_iter = iter(rows)
+        while True:
+            batch = list(islice(rows_iter, settings.STREAM_CHUNK_SIZE))
+            if not batch:
+                break
+            yield rows_template.render({name: batch})
+        yield tail
+
+    return StreamingHttpResponse(chunks())
@@ -0,0 +1,30 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+def build_srcset(variants):
+    return ', '.join(
+        f'{variant.file.url} {variant.width}w' for variant in variants)
+
+
+@register.inclusion_tag('posts/includes/responsive_image.html')
+def responsive_image(post):
+    """Картинка поста в <picture>."""
+    context = {'post': post, 'sizes': settings.IMAGE_VARIANT_SIZES}
+    if not post.variants_ready:
+        return context
+    by_format = {}
+    for variant in post.variants.all():
+        by_format.setdefault(variant.format, []).append(variant)
+    fallback = by_format.pop('jpeg', None)
+    if not fallback:
+        return context
+    context['sources'] = [
+        {'type': f'image/{fmt}', 'srcset': build_srcset(by_format[fmt])}
+        for fmt in settings.IMAGE_VARIANT_FORMATS if fmt in by_format
+    ]
+    context['img'] = fallback[-1]
+    context['srcset'] = build_srcset(fallback)
+    return context
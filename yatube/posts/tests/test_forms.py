@@ -1,15 +1,26 @@
+import os
 import shutil
 import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
 from faker import Faker
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
 
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.conf import settings
 
-from ..models import Group, Post, Comment
+from .. import variants
+from ..models import Group, MediaBlob, Post, Comment, ThumbnailJob
+from ..storage import UMASK
 
 fake = Faker()
 User = get_user_model()
@@ -205,3 +216,248 @@ class CommentsTests(TestCase):
             'posts:add_comment', args=(self.post.id,))
         self.assertRedirects(response, redirect_address)
         self.assertEqual(Comment.objects.count(), comments_count)
+
+
+class ImageTestCase(TestCase):
+    """Автор, его клиент и картинки."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_image(self, name, size=(40, 20), color='red', with_exif=False):
+        image_format = Image.registered_extensions()[os.path.splitext(name)[1]]
+        file_obj = BytesIO()
+        options = {}
+        if with_exif:
+            exif = Image.Exif()
+            exif[0x010F] = 'Camera'
+            options['exif'] = exif.tobytes()
+        Image.new('RGB', size, color).save(file_obj, image_format, **options)
+        return SimpleUploadedFile(
+            name, file_obj.getvalue(),
+            content_type=f'image/{image_format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(ImageTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_thumbnails_generated_on_create(self):
+        """Миниатюры готовы сразу."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': fake.text(), 'image': self.get_image('a.png')},
+        )
+        post = Post.objects.get()
+        job = ThumbnailJob.objects.get(image=post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        thumbnail = get_thumbnail(
+            post.image, *settings.THUMBNAIL_SIZES[0][:1],
+            **settings.THUMBNAIL_SIZES[0][1])
+        self.assertTrue(thumbnail.exists())
+
+    @override_settings(THUMBNAIL_PIPELINE_ASYNC=True)
+    def test_queued_jobs_processed_by_command(self):
+        """Команда разбирает очередь."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': fake.text(), 'image': self.get_image('b.png')},
+        )
+        queued = ThumbnailJob.objects.get()
+        self.assertEqual(queued.status, ThumbnailJob.PENDING)
+        default_storage.save('posts/legacy.png', self.get_image('c.png'))
+        call_command(
+            'pregenerate_thumbnails', workers=0, stdout=StringIO())
+        self.assertEqual(
+            set(ThumbnailJob.objects.values_list('status', flat=True)),
+            {ThumbnailJob.DONE})
+        self.assertTrue(ThumbnailJob.objects.filter(
+            image='posts/legacy.png').exists())
+
+    @override_settings(THUMBNAIL_LEASE_TIMEOUT=60)
+    def test_live_jobs_not_requeued(self):
+        """Живые задания не повторяются."""
+        for name in ('live.png', 'abandoned.png'):
+            default_storage.save(f'posts/{name}', self.get_image(name))
+            ThumbnailJob.objects.create(
+                image=f'posts/{name}', status=ThumbnailJob.PROCESSING)
+        ThumbnailJob.objects.filter(image='posts/abandoned.png').update(
+            updated=timezone.now() - timedelta(minutes=5))
+        call_command(
+            'pregenerate_thumbnails', workers=0, stdout=StringIO())
+        self.assertEqual(
+            dict(ThumbnailJob.objects.values_list('image', 'status')),
+            {'posts/live.png': ThumbnailJob.PROCESSING,
+             'posts/abandoned.png': ThumbnailJob.DONE})
+
+    def test_responsive_variants(self):
+        """Версии выводятся в <picture>."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': self.get_image('wide.png', (700, 300)),
+            },
+        )
+        post = Post.objects.get()
+        self.assertTrue(post.variants_ready)
+        formats = variants.available_formats()
+        self.assertEqual(
+            set(post.variants.values_list('format', 'width')),
+            {(fmt, width) for fmt in formats for width in (320, 640)})
+        for variant in post.variants.all():
+            with Image.open(variant.file) as image:
+                self.assertEqual(image.size, (variant.width, variant.height))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(post.id,)))
+        self.assertContains(response, '<picture>')
+        self.assertContains(
+            response, f'{post.variants.get(format="jpeg", width=640).file.url}'
+            ' 640w')
+        for fmt in formats:
+            if fmt != 'jpeg':
+                self.assertContains(response, f'type="image/{fmt}"')
+
+    def test_variants_reset_on_image_change(self):
+        """Новая картинка сбрасывает версии."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.get_image('old.png')},
+        )
+        post = Post.objects.get()
+        with override_settings(THUMBNAIL_PIPELINE_ASYNC=True):
+            self.authorized_client.post(
+                reverse('posts:post_edit', args=(post.id,)),
+                data={'text': 'Пост', 'image': self.get_image('new.png')},
+            )
+        post.refresh_from_db()
+        self.assertFalse(post.variants_ready)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(ImageTestCase):
+    def create_post(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': image},
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=100)
+    def test_oversized_image_downscaled_without_exif(self):
+        """Большой оригинал уменьшается."""
+        self.create_post(
+            self.get_image('photo.jpg', (400, 200), with_exif=True))
+        post = Post.objects.get()
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=100)
+    def test_oversized_gif_downscaled(self):
+        """GIF тоже уменьшается."""
+        file_obj = BytesIO()
+        Image.new('P', (400, 200)).save(file_obj, 'gif')
+        self.create_post(SimpleUploadedFile(
+            'anim.gif', file_obj.getvalue(), content_type='image/gif'))
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual((image.format, image.size), ('GIF', (100, 50)))
+
+    def test_other_formats_converted_to_png(self):
+        """BMP перекодируется в PNG."""
+        file_obj = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(file_obj, 'bmp')
+        self.create_post(SimpleUploadedFile(
+            'picture.bmp', file_obj.getvalue(), content_type='image/bmp'))
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, 'PNG')
+
+    def test_small_image_kept_as_is(self):
+        """Малая картинка не меняется."""
+        upload = self.get_image('photo.jpg', (40, 20))
+        content = upload.read()
+        upload.seek(0)
+        self.create_post(upload)
+        post = Post.objects.get()
+        self.assertEqual(post.image.read(), content)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """Лимит пикселей по заголовку."""
+        response = self.create_post(self.get_image('photo.jpg', (100, 100)))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Изображение слишком большое: '
+            '100×100 пикселей.')
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_large_file_rejected(self):
+        """Лимит размера файла."""
+        response = self.create_post(self.get_image('photo.jpg', (40, 20)))
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(
+            response.context['form'].errors['image'][0],
+            'Файл больше 100\xa0байт.')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(ImageTestCase):
+    def create_post(self, name, color='green'):
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост',
+                'image': self.get_image(name, (30, 30), color),
+            },
+        )
+        return Post.objects.latest('id')
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки — один файл."""
+        first = self.create_post('one.png')
+        second = self.create_post('two.png')
+        other = self.create_post('three.png', color='black')
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}'
+            r'\.png$')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(
+            MediaBlob.objects.get(name=first.image.name).refcount, 2)
+        self.assertEqual(
+            ThumbnailJob.objects.filter(image=first.image.name).count(), 1)
+        self.assertTrue(second.variants_ready)
+        self.assertEqual(
+            set(second.variants.values_list('file', flat=True)),
+            set(first.variants.values_list('file', flat=True)))
+
+    def test_saved_file_permissions(self):
+        """Права файла 0666 & ~umask."""
+        post = self.create_post('one.png')
+        mode = os.stat(post.image.path).st_mode & 0o777
+        self.assertEqual(mode, 0o666 & ~UMASK)
+
+    def test_last_reference_removes_file(self):
+        """Файл удаляется с последним постом."""
+        first = self.create_post('one.png')
+        second = self.create_post('two.png')
+        name = first.image.name
+        storage = Post.image.field.storage
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            first.delete()
+            self.assertTrue(storage.exists(name))
+            self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(ThumbnailJob.objects.filter(image=name).exists())
@@ -1,10 +1,26 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
 from faker import Faker
 
+from io import BytesIO, StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 from django.conf import settings
 
-from ..models import Group, Post
+from .. import moderation, search
+from ..bulkload import iter_json_array
+from ..models import (
+    Comment, Follow, Group, MediaBlob, ModerationJob, Post, TimelineEntry,
+    UserStats,
+)
 
 fake = Faker()
 User = get_user_model()
@@ -34,3 +50,319 @@ class PostModelTest(TestCase):
         for field, expected_value in field_str.items():
             with self.subTest(field=field):
                 self.assertEqual(field, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def assertStats(self, user, posts, followers, following):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following))
+
+    def test_counters_follow_changes(self):
+        """Счётчики следуют за изменениями."""
+        post = Post.objects.create(author=self.author, text=fake.text())
+        Follow.objects.create(user=self.user, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text=fake.text())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertStats(self.author, 1, 1, 0)
+        self.assertStats(self.user, 0, 0, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        Follow.objects.all().delete()
+        post.delete()
+        self.assertStats(self.author, 0, 0, 0)
+        self.assertStats(self.user, 0, 0, 0)
+
+    def test_stale_post_keeps_comments_count(self):
+        """Старый экземпляр хранит счётчик."""
+        post = Post.objects.create(author=self.author, text=fake.text())
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.user, text=fake.text())
+        stale.text = 'Правка'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual((post.text, post.comments_count), ('Правка', 1))
+
+    def test_rebuild_counters_command(self):
+        """rebuild_counters чинит счётчики."""
+        post = Post.objects.create(author=self.author, text=fake.text())
+        Comment.objects.create(post=post, author=self.user, text=fake.text())
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        Post.objects.update(comments_count=0)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn(
+            'пользователей 2, постов 1', out.getvalue())
+        self.assertStats(self.author, 1, 0, 0)
+        self.assertStats(self.user, 0, 0, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+class BulkLoadTest(TestCase):
+    def test_stream_parser_handles_chunk_boundaries(self):
+        """Разбор через границы кусков."""
+        items = [
+            {'text': 'Ёжик в тумане', 'n': 12345},
+            {'list': [1, 2]},
+            7,
+        ]
+        raw = json.dumps(items, ensure_ascii=False, indent=2).encode()
+        self.assertEqual(
+            list(iter_json_array(BytesIO(raw), read_size=7)), items)
+
+    def test_broken_array_rejected(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('[{"a": 1}, {"b":')))
+
+    def test_command_loads_fixture_and_rebuilds(self):
+        """Загрузка с пересчётом."""
+        image = f'posts/ab/cd/{"ab" * 32}.png'
+        fixture = [
+            {'model': 'auth.user', 'pk': 100, 'fields': {
+                'username': 'reader', 'password': '', 'groups': [],
+                'user_permissions': [1, 2]}},
+            {'model': 'auth.user', 'pk': 101, 'fields': {
+                'username': 'writer', 'password': ''}},
+            {'model': 'posts.follow', 'pk': 1, 'fields': {
+                'user': 100, 'author': 101}},
+        ] + [
+            {'model': 'posts.post', 'pk': 200 + number, 'fields': {
+                'text': f'Пост про котов {number}',
+                'pub_date': '2022-08-06T17:22:19Z',
+                'author': 101, 'group': None,
+                'image': image if number < 2 else ''}}
+            for number in range(5)
+        ] + [
+            {'model': 'posts.comment', 'pk': 5, 'fields': {
+                'created': '2022-08-06T17:22:19Z', 'post': 200,
+                'author': 100, 'text': 'Комментарий'}},
+            {'model': 'posts.comment', 'fields': {
+                'created': '2022-08-06T17:22:19Z', 'post': 200,
+                'author': 100, 'text': 'Комментарий без pk'}},
+        ]
+        handle, path = tempfile.mkstemp(suffix='.json.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with gzip.open(path, 'wt', encoding='utf-8') as stream:
+            json.dump(fixture, stream)
+        out = StringIO()
+        call_command('bulk_loaddata', path, batch_size=2, stdout=out)
+        self.assertIn('Загружено строк: 12', out.getvalue())
+        self.assertEqual(
+            Comment.objects.get(pk=5).text, 'Комментарий')
+        self.assertEqual(MediaBlob.objects.get(name=image).refcount, 2)
+        self.assertEqual(
+            User.objects.get(pk=100).user_permissions.count(), 2)
+        self.assertEqual(UserStats.objects.get(user_id=101).posts_count, 5)
+        self.assertEqual(Post.objects.get(pk=200).comments_count, 2)
+        self.assertEqual(Post.objects.get(pk=200).pub_date.year, 2022)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=100).count(), 5)
+        response = self.client.get('/search/', {'q': 'кот'})
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_existing_content_types_matched(self):
+        """Типы и права сверяются по ключу."""
+        fixture = [
+            {'model': 'contenttypes.contenttype', 'pk': 1, 'fields': {
+                'app_label': 'posts', 'model': 'post'}},
+            {'model': 'auth.permission', 'pk': 1, 'fields': {
+                'name': 'Can add post', 'content_type': 1,
+                'codename': 'add_post'}},
+            {'model': 'auth.user', 'pk': 100, 'fields': {
+                'username': 'reader', 'password': '',
+                'user_permissions': [1]}},
+        ]
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump(fixture, stream)
+        call_command('bulk_loaddata', path, stdout=StringIO())
+        self.assertEqual(
+            list(User.objects.get(pk=100).user_permissions.values_list(
+                'content_type__model', 'codename')),
+            [('post', 'add_post')])
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.old_post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Старый пост')
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date='2020-01-01T00:00:00Z')
+        cls.new_post = Post.objects.create(
+            author=cls.author, text='Новый')
+        Comment.objects.create(
+            post=cls.new_post, author=cls.user, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def read(self, name):
+        with gzip.open(os.path.join(self.output, name), 'rt') as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_export_and_load_back(self):
+        """Выгрузка загружается обратно."""
+        call_command(
+            'export_yatube', output=self.output, compress=True,
+            chunk_size=1, stdout=StringIO())
+        posts = self.read('posts.post.jsonl.gz')
+        self.assertEqual(
+            {record['pk'] for record in posts},
+            {self.old_post.pk, self.new_post.pk})
+        self.assertEqual(posts[0]['fields']['group'], self.group.pk)
+        self.assertEqual(len(self.read('posts.follow.jsonl.gz')), 1)
+        paths = sorted(
+            os.path.join(self.output, name)
+            for name in os.listdir(self.output))
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command('bulk_loaddata', *paths, stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get(pk=self.old_post.pk).pub_date.year, 2020)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.user).count(), 2)
+
+    def test_incremental_export(self):
+        """--since отбирает по дате."""
+        call_command(
+            'export_yatube', output=self.output, compress=True,
+            since='2021-01-01', stdout=StringIO())
+        self.assertEqual(
+            [record['pk'] for record in self.read('posts.post.jsonl.gz')],
+            [self.new_post.pk])
+        self.assertEqual(len(self.read('posts.comment.jsonl.gz')), 1)
+        self.assertEqual(len(self.read('posts.group.jsonl.gz')), 1)
+
+
+@override_settings(MODERATION_CHUNK_SIZE=2, MODERATION_ASYNC=False)
+class ModerationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.spam = Group.objects.create(title='Спам', slug='spam')
+        cls.archive = Group.objects.create(title='Архив', slug='archive')
+        Follow.objects.create(user=cls.reader, author=cls.spammer)
+        cls.spam_posts = [
+            Post.objects.create(
+                author=cls.spammer, group=cls.spam,
+                text=f'Купите {number}')
+            for number in range(3)
+        ]
+        cls.post = Post.objects.create(
+            author=cls.reader, text='Обычный')
+        for post in cls.spam_posts:
+            Comment.objects.create(post=post, author=cls.reader, text='Нет')
+        Comment.objects.create(post=cls.post, author=cls.spammer, text='Да')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+
+    def test_regroup_command(self):
+        out = StringIO()
+        call_command(
+            'moderate', 'regroup', from_group='spam', group='archive',
+            stdout=out)
+        self.assertEqual(self.archive.posts.count(), 3)
+        self.assertFalse(self.spam.posts.exists())
+        self.assertIn('3/3', out.getvalue())
+
+    def test_delete_author_command(self):
+        """Удаляется всё, что написал автор."""
+        call_command(
+            'moderate', 'delete-author', author='spammer', stdout=StringIO())
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.spammer).posts_count, 0)
+        self.assertFalse(
+            search.filter_posts(Post.objects, 'купите').exists())
+
+    def test_purge_comments_command(self):
+        call_command(
+            'moderate', 'purge-comments', author='spammer', stdout=StringIO())
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(
+            set(Post.objects.filter(author=self.spammer).values_list(
+                'comments_count', flat=True)),
+            {0},
+        )
+
+    @override_settings(MODERATION_BACKGROUND_THRESHOLD=2)
+    def test_admin_actions(self):
+        """Большая выборка уходит в фон."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@test.ru', password='pass')
+        self.client.force_login(admin)
+        url = reverse('admin:posts_post_changelist')
+        self.client.post(url, {
+            'action': 'regroup_selected',
+            '_selected_action': [self.spam_posts[0].id],
+            'group': self.archive.id,
+        })
+        self.assertEqual(self.archive.posts.get(), self.spam_posts[0])
+        self.assertFalse(ModerationJob.objects.exists())
+        self.client.post(url, {
+            'action': 'delete_selected_posts',
+            '_selected_action': [post.id for post in self.spam_posts],
+        })
+        job = ModerationJob.objects.get()
+        self.assertEqual(job.status, ModerationJob.DONE)
+        self.assertEqual((job.done, job.total), (6, 6))
+        self.assertEqual(json.loads(job.params), {'post_ranges': [
+            [self.spam_posts[0].id, self.spam_posts[-1].id]]})
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+
+    def test_selection_ranges(self):
+        """Выборка хранится диапазонами."""
+        first, middle, last = self.spam_posts
+        ranges, count = moderation.id_ranges(
+            Post.objects.filter(author=self.spammer).exclude(pk=middle.pk))
+        self.assertEqual(count, 2)
+        self.assertEqual(ranges, [[first.id, first.id], [last.id, last.id]])
+        last.delete()
+        self.assertEqual(
+            moderation.selection(Post, {'post_ranges': ranges}, 'post'),
+            [first.id])
+
+    @override_settings(MODERATION_LEASE_TIMEOUT=60)
+    def test_run_pending_skips_live_jobs(self):
+        """Живые задания не повторяются."""
+        params = json.dumps({'post_ids': [self.post.id]})
+        live = ModerationJob.objects.create(
+            action=ModerationJob.DELETE_POSTS, params=params,
+            status=ModerationJob.PROCESSING)
+        abandoned = ModerationJob.objects.create(
+            action=ModerationJob.DELETE_POSTS, params=params,
+            status=ModerationJob.PROCESSING)
+        ModerationJob.objects.filter(pk=abandoned.pk).update(
+            updated=timezone.now() - timedelta(minutes=5))
+        call_command('moderate', 'run-pending', stdout=StringIO())
+        live.refresh_from_db()
+        abandoned.refresh_from_db()
+        self.assertEqual(live.status, ModerationJob.PROCESSING)
+        self.assertEqual(abandoned.status, ModerationJob.DONE)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
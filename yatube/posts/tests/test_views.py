@@ -1,18 +1,29 @@
 import random
+import re
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from faker import Faker
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
 from django.urls import reverse
+from django.utils import timezone
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from .. import benchmark, feed_cache, search, timeline, urls
 from ..forms import PostForm
-from ..models import Group, Post, Follow
+from ..fragments import CARD_TEMPLATE
+from ..models import Comment, Group, Post, Follow, TimelineEntry
+from ..paginator import CursorPaginator, encode_cursor
 
 fake = Faker()
 User = get_user_model()
@@ -142,6 +153,9 @@ class PaginatorViewsTest(TestCase):
                      group=cls.group)
             ])
 
+    def setUp(self):
+        cache.clear()
+
     def test_pagination(self):
         """Тестирование Paginatora."""
         count_post_one_page = settings.POSTS_CHIK
@@ -165,6 +179,55 @@ class PaginatorViewsTest(TestCase):
                     len(response_two_page.context['page_obj']),
                     count_post_two_page)
 
+    @override_settings(LEGACY_PAGE_LIMIT=2)
+    def test_legacy_page_capped(self):
+        """?page=N ограничен и без COUNT(*)."""
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = self.client.get(url + '?page=1000').context['page_obj']
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        self.assertEqual(
+            list(page_obj),
+            expected[settings.POSTS_CHIK:2 * settings.POSTS_CHIK])
+        self.assertTrue(page_obj.has_previous())
+
+    def test_cursor_pagination(self):
+        """Курсоры без пропусков и повторов."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        tested_urls_paginations = {
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    args=(self.group.slug,)),
+            reverse('posts:profile',
+                    args=(self.user,))
+        }
+        for url in tested_urls_paginations:
+            with self.subTest(url=url):
+                cache.clear()
+                first_page = self.client.get(url).context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                self.assertTrue(first_page.has_next())
+                second_page = self.client.get(
+                    url, {'after': first_page.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(first_page) + list(second_page), expected)
+                self.assertFalse(second_page.has_next())
+                back_page = self.client.get(
+                    url, {'before': second_page.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back_page), list(first_page))
+
+    def test_cursor_pagination_skips_count(self):
+        """Курсор без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), settings.POSTS_CHIK)
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = paginator.get_page(after='broken-cursor')
+            self.assertEqual(len(page_obj), settings.POSTS_CHIK)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
 
 class CacheTests(TestCase):
     @classmethod
@@ -183,15 +246,71 @@ class CacheTests(TestCase):
         cache.clear()
 
     def test_cache_index_page(self):
-        """Тест кэширования страницы index.html."""
-        test_post = Post.objects.create(author=CacheTests.user)
-        response = self.client.get(reverse('posts:index'))
+        """Лента index берётся из кэша."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # Кроме даты для ETag (LIMIT 1).
+        self.assertFalse(any(
+            'ORDER BY' in query['sql']
+            and not query['sql'].endswith('LIMIT 1')
+            for query in queries))
+        test_post = Post.objects.create(
+            author=CacheTests.user, text='Новый')
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'][0], test_post)
         test_post.delete()
-        response_2 = self.client.get(reverse('posts:index'))
-        self.assertEqual(response.content, response_2.content)
-        cache.clear()
-        response_3 = self.client.get(reverse('posts:index'))
-        self.assertNotEqual(response.content, response_3.content)
+        response = self.client.get(url)
+        self.assertNotIn(test_post, response.context['page_obj'])
+
+    def test_stale_feed_served_while_revalidating(self):
+        """Отдаётся старая копия ленты."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        feed_cache.bump(feed_cache.GLOBAL_FEED)
+        cache.add(f'feed:{feed_cache.GLOBAL_FEED}:first:lock', 1)
+        Post.objects.bulk_create(
+            [Post(author=CacheTests.user, text='Новый')])
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    def test_cursor_spellings_share_entry(self):
+        """Курсоры делят запись кэша."""
+        url = reverse('posts:index')
+        spellings = ('', '?after=', '?after=мусор',
+                     '?before=x&after=%21')
+        for query in spellings:
+            self.client.get(url + query)
+        self.assertIsNotNone(cache.get(f'feed:{feed_cache.GLOBAL_FEED}:first'))
+        self.assertEqual(
+            feed_cache.entry_key(
+                feed_cache.GLOBAL_FEED, CursorPaginator([], 10),
+                encode_cursor((self.post.pub_date, self.post.id)) + '==',
+                None),
+            f'feed:{feed_cache.GLOBAL_FEED}:after:'
+            f'{self.post.pub_date.isoformat()}:{self.post.id}')
+
+    def test_cold_miss_waits_for_lock_holder(self):
+        """Пустой кэш ждёт блокировку."""
+        key = f'feed:{feed_cache.GLOBAL_FEED}:first'
+        cache.add(f'{key}:lock', 1)
+        Post.objects.bulk_create(
+            [Post(author=CacheTests.user, text='Новый')])
+
+        def lock_holder_done(seconds):
+            cache.set(key, {
+                'version': feed_cache.get_version(feed_cache.GLOBAL_FEED),
+                'fresh_until': time.time() + 60,
+                'ids': [self.post.id],
+                'has_next': False,
+                'has_previous': False,
+            })
+
+        with mock.patch.object(
+                feed_cache.time, 'sleep', side_effect=lock_holder_done):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
 
 
 class FollowTests(TestCase):
@@ -268,3 +387,731 @@ class FollowTests(TestCase):
         follow_exist = Follow.objects.filter(user=author_user,
                                              author=author_user).exists()
         self.assertFalse(follow_exist)
+
+    def test_follow_index_uses_timeline(self):
+        """Лента подписок из timeline."""
+        author_user = User.objects.create_user(username='author_user')
+        old_post = Post.objects.create(text=fake.text(), author=author_user)
+        Follow.objects.create(user=self.user, author=author_user)
+        new_post = Post.objects.create(text=fake.text(), author=author_user)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user).values_list('post_id', flat=True)),
+            {old_post.id, new_post.id})
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, old_post])
+        Follow.objects.filter(user=self.user, author=author_user).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=0)
+    def test_follow_index_reads_celebrity_posts(self):
+        """Популярные авторы при чтении."""
+        celebrity = User.objects.create_user(username='celebrity')
+        Follow.objects.create(user=self.user, author=celebrity)
+        posts = [
+            Post.objects.create(text=fake.text(), author=celebrity)
+            for _ in range(settings.POSTS_CHIK + 1)
+        ]
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[:0:-1])
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'),
+            {'after': page_obj.paginator.next_cursor})
+        self.assertEqual(list(response.context['page_obj']), posts[:1])
+
+    @override_settings(
+        TIMELINE_CELEBRITY_FOLLOWERS=1, TIMELINE_DEMOTE_FOLLOWERS=1)
+    def test_demoted_celebrity_posts_stay_in_feed(self):
+        """Посты остаются в лентах."""
+        celebrity = User.objects.create_user(username='celebrity')
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.user, author=celebrity)
+        Follow.objects.create(user=other, author=celebrity)
+        post = Post.objects.create(text=fake.text(), author=celebrity)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=other, author=celebrity).delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(
+        TIMELINE_CELEBRITY_FOLLOWERS=2, TIMELINE_DEMOTE_FOLLOWERS=1,
+        TIMELINE_ASYNC=True)
+    def test_demotion_hysteresis(self):
+        """Статус снимается в фоне."""
+        celebrity = User.objects.create_user(username='celebrity')
+        others = [
+            User.objects.create_user(username=f'other_{number}')
+            for number in range(2)
+        ]
+        for user in (self.user, *others):
+            Follow.objects.create(user=user, author=celebrity)
+        post = Post.objects.create(text=fake.text(), author=celebrity)
+        for other in others:
+            Follow.objects.filter(user=other, author=celebrity).delete()
+            self.assertTrue(timeline.is_celebrity(celebrity))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(timeline.demote(celebrity.id), [self.user.id])
+        self.assertFalse(timeline.is_celebrity(celebrity))
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.user.id, post.id)])
+        self.assertEqual(timeline.demote(celebrity.id), [])
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text=fake.text())
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=User.objects.create_user(
+                username=f'commentator_{i}'), text=fake.text())
+            for i in range(settings.POSTS_CHIK)
+        ])
+
+    def test_every_view_has_query_budget(self):
+        """У каждого view есть бюджет."""
+        for pattern in urls.urlpatterns:
+            with self.subTest(view=pattern.name):
+                self.assertIsNotNone(
+                    getattr(pattern.callback, 'query_budget', None))
+
+    def test_post_detail_comments_without_n_plus_one(self):
+        """Комментарии без N+1."""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        # Валидаторы ETag, пост, комментарии.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(
+            len(response.context['comments']), settings.POSTS_CHIK)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Старое название',
+            slug='group-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Текст карточки',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_rendered_once(self):
+        """Карточки берутся из кэша."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, CARD_TEMPLATE)
+        response = self.client.get(url)
+        self.assertTemplateNotUsed(response, CARD_TEMPLATE)
+        self.assertContains(response, self.post.text)
+
+    def test_cards_invalidated_on_changes(self):
+        """Правки меняют карточку."""
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.client.get(url)
+        changes = (
+            (Post.objects.get(pk=self.post.pk),
+             'text', 'Новый текст поста'),
+            (Group.objects.get(pk=self.group.pk),
+             'title', 'Новая группа'),
+            (User.objects.get(pk=self.user.pk),
+             'first_name', 'Новое имя'),
+        )
+        for obj, field, value in changes:
+            with self.subTest(field=field):
+                setattr(obj, field, value)
+                obj.save()
+                response = self.client.get(url)
+                self.assertTemplateUsed(response, CARD_TEMPLATE)
+                self.assertContains(response, value)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.cat_post = Post.objects.create(
+            author=cls.user,
+            text='Коты и кошки любят '
+                 'гулять по крышам')
+        cls.catty_post = Post.objects.create(
+            author=cls.user,
+            text='Кот, кот и ещё раз котами')
+        cls.dog_post = Post.objects.create(
+            author=cls.user,
+            text='Собака лает на прохожих')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def test_stemmed_and_ranked(self):
+        """Словоформы и ранжирование."""
+        response = self.search('котов')
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.catty_post, self.cat_post])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс следует за правками."""
+        post = Post.objects.get(id=self.dog_post.id)
+        post.text = 'Собака гоняет котов'
+        post.save()
+        self.assertIn(post, self.search('кот').context['page_obj'])
+        post.delete()
+        self.assertNotIn(post, self.search('собака').context['page_obj'])
+
+    def test_keyset_pages(self):
+        """Листание курсором."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Кот номер {number}')
+            for number in range(settings.POSTS_CHIK + 3)
+        ])
+        search.rebuild(Post.objects.all())
+        first = self.search('кот').context['page_obj']
+        cursor = first.paginator.next_cursor
+        self.assertIsNotNone(cursor)
+        second = self.search('кот', after=cursor).context['page_obj']
+        found = list(first) + list(second)
+        self.assertEqual(len(found), settings.POSTS_CHIK + 5)
+        self.assertEqual(len(set(found)), len(found))
+        self.assertFalse(second.has_next())
+        back = self.search(
+            'кот', before=second.paginator.previous_cursor)
+        self.assertEqual(list(back.context['page_obj']), list(first))
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 экранируются."""
+        response = self.search('кот" OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        """Админка ищет через индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошка'})
+        self.assertEqual(
+            set(response.context['cl'].queryset),
+            {self.cat_post})
+
+
+class QueryPlanTests(TestCase):
+    """Запросы страниц идут по индексам."""
+    BAD_PLAN = re.compile(r'^SCAN (?!.*\bUSING\b)|TEMP B-TREE')
+    # Сортировка FTS5 по bm25 без индекса.
+    RANKED_PLAN = re.compile(r'^SCAN \w+ VIRTUAL TABLE')
+    # Группы целиком выводятся в <select>.
+    FULL_LIST_PLANS = {'SCAN posts_group'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Пост про котов')
+        Post.objects.create(author=cls.author, text='Пост автора')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def capture_selects(self, url):
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return statements
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_views_use_indexes(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('posts:post_comments', args=(self.post.id,)),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=кот',
+            reverse('posts:post_edit', args=(self.post.id,)),
+            reverse('posts:post_create'),
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.user.username,)),
+            reverse('posts:api_follow_index'),
+            reverse('posts:api_post_detail', args=(self.post.id,)),
+        )
+        for url in urls:
+            for sql, params in self.capture_selects(url):
+                plan = self.explain(sql, params)
+                if (any(self.RANKED_PLAN.search(line) for line in plan)
+                        or set(plan) <= self.FULL_LIST_PLANS):
+                    continue
+                with self.subTest(url=url, sql=sql):
+                    self.assertFalse(
+                        [line for line in plan if self.BAD_PLAN.search(line)],
+                        plan)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create([
+            Post(author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(settings.POSTS_CHIK + 2)
+        ])
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Последний пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """Ленты отдают JSON с курсором."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), settings.POSTS_CHIK)
+                self.assertEqual(data['results'][0]['text'], self.post.text)
+                self.assertEqual(data['results'][0]['author'], 'author')
+                self.assertIsNone(data['previous'])
+                data = self.client.get(url, {'after': data['next']}).json()
+                self.assertEqual(len(data['results']), 3)
+                self.assertIsNone(data['next'])
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304."""
+        url = reverse('posts:api_group_list', args=(self.group.slug,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        Post.objects.create(
+            author=self.author, group=self.group, text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_feed(self):
+        """Лента подписок по пользователю."""
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(
+            len(response.json()['results']), settings.POSTS_CHIK)
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_follow_feed_follows_edits(self):
+        """Правка поста даёт 200 в подписках."""
+        url = reverse('posts:api_follow_index')
+        self.client.force_login(self.user)
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Правка')
+
+    def test_post_detail(self):
+        """Пост с комментариями."""
+        url = reverse('posts:api_post_detail', args=(self.post.id,))
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertEqual(data['comments'][0]['author'], 'auth')
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='2')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class HttpCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_pages_are_public(self):
+        """Страницы анонима публичны."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('about:author'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                response = self.authorized_client.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_etag_follows_comments(self):
+        """Комментарий меняет ETag."""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Да')
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_edit_changes_follow_etag(self):
+        """Правка поста меняет ETag подписок."""
+        Follow.objects.create(user=self.user, author=self.author)
+        url = reverse('posts:follow_index')
+        etag = self.authorized_client.get(url)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка'
+        post.save()
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Правка')
+
+    def test_rename_changes_etag(self):
+        """Переименование меняет ETag ленты."""
+        url = reverse('posts:index')
+        for obj, field in ((self.group, 'title'), (self.author, 'username')):
+            with self.subTest(field=field):
+                etag = self.client.get(url)['ETag']
+                setattr(obj, field, 'renamed')
+                obj.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'renamed')
+
+    def test_stale_page_is_not_cached(self):
+        """Старая копия не кэшируется."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        feed_cache.bump(feed_cache.GLOBAL_FEED)
+        with mock.patch.object(
+                feed_cache.cache, 'add', return_value=False):
+            response = self.client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertContains(response, self.post.text)
+
+    def test_edit_moves_last_modified(self):
+        """Правка сдвигает Last-Modified."""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        last_modified = self.client.get(url)['Last-Modified']
+        later = time.time() + 5
+        with mock.patch.object(feed_cache.time, 'time', return_value=later):
+            feed_cache.bump(feed_cache.author_feed(self.author.id))
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+@override_settings(
+    STREAM_PAGES=True, STREAM_CHUNK_SIZE=2, COMMENTS_PER_PAGE=2)
+class StreamingPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user,
+                    text=f'Отзыв {number}')
+            for number in range(5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_post_detail_streams_comments(self):
+        """Комментарии идут пачками."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 5)
+        self.assertIn('<html', chunks[0])
+        self.assertIn('csrfmiddlewaretoken', chunks[0])
+        self.assertNotIn('Отзыв', chunks[0])
+        self.assertIn('</html>', chunks[-1])
+        page = ''.join(chunks)
+        for number in range(5):
+            self.assertIn(f'Отзыв {number}', page)
+        self.assertLess(page.index('Отзыв 4'), page.index('Отзыв 0'))
+        self.assertNotIn('data-comments-more', page)
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('ETag', response)
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Отзыв {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_batch(self):
+        """Первая пачка и полный счётчик."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Отзыв 4', 'Отзыв 3', 'Отзыв 2'])
+        self.assertContains(response, 'Комментариев: 5')
+        self.assertContains(response, 'data-comments-more')
+
+    def test_fragment_returns_next_batch(self):
+        """Фрагмент отдаёт остаток."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        cursor = response.context['comments_page'].paginator.next_cursor
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        response = self.client.get(url, {'after': cursor})
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Отзыв 1', 'Отзыв 0'])
+        self.assertNotContains(response, 'data-comments-more')
+        self.assertNotContains(response, '<html')
+        response = self.client.get(
+            reverse('posts:api_post_detail', args=(self.post.id,)),
+            {'after': cursor})
+        self.assertEqual(len(response.json()['comments']), 2)
+        self.assertIsNone(response.json()['comments_next'])
+
+    def test_fragment_of_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.ru', password='pass')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                author=self.admin,
+                group=self.groups[number % 3],
+                text=f'Пост {number}',
+            )
+            Comment.objects.create(post=post, author=self.admin, text='Да')
+
+    def changelist_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Запросы не растут со строками."""
+        urls = (
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_follow_changelist'),
+        )
+        self.add_posts(2)
+        before = {url: len(self.changelist_queries(url)) for url in urls}
+        self.add_posts(10)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    len(self.changelist_queries(url)), before[url])
+
+    def test_post_changelist_avoids_full_scans(self):
+        """Список постов без DISTINCT."""
+        self.add_posts(3)
+        queries = self.changelist_queries(
+            reverse('admin:posts_post_changelist'))
+        counts = [sql for sql in queries if 'COUNT(' in sql]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts))
+        self.assertFalse(any('DISTINCT' in sql for sql in queries))
+        self.assertEqual(
+            sum('FROM "posts_group"' in sql for sql in queries), 1)
+        today = timezone.localdate()
+        drill_down = (
+            {'pub_date__year': today.year},
+            {'pub_date__year': today.year, 'pub_date__month': today.month},
+        )
+        for params in drill_down:
+            with self.subTest(params=params):
+                response = self.client.get(
+                    reverse('admin:posts_post_changelist'), params)
+                self.assertContains(response, 'Пост 2')
+
+    def test_group_choices_cache_reset(self):
+        """Новая группа видна в <select>."""
+        self.add_posts(1)
+        url = reverse('admin:posts_post_changelist')
+        self.client.get(url)
+        self.client.post(reverse('admin:posts_group_add'), {
+            'title': 'Новая группа', 'slug': 'new-group'})
+        self.assertContains(self.client.get(url), 'Новая группа')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TransactionTestCase):
+    """Нагрузочный прогон без транзакции."""
+    def setUp(self):
+        cache.clear()
+        benchmark.seed({
+            'users': 4, 'groups': 2, 'posts': 10, 'follows': 2,
+            'comments': 10, 'images': 1,
+        })
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed(self):
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Follow.objects.count(), 8)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(Post.objects.exclude(image='').count(), 1)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_all_scenarios_run_without_errors(self):
+        results = benchmark.run(
+            benchmark.ClientDriver(), list(benchmark.SCENARIOS),
+            benchmark.Dataset(), count=4, concurrency=1, warmup=1)
+        for name, row in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(row['requests'], 4)
+                self.assertEqual(row['errors'], 0)
+                self.assertGreater(row['p99_ms'], 0)
+        self.assertEqual(Post.objects.count(), 10 + 4 + 1)
+
+    def test_broken_scenario_aborts_run(self):
+        def build(data, rng, fake):
+            raise KeyError('post_ids')
+
+        scenario = benchmark.Scenario('broken', build)
+        with self.assertRaisesMessage(
+                benchmark.ScenarioError, "broken: KeyError: 'post_ids'"):
+            benchmark.run_scenario(
+                benchmark.ClientDriver(), scenario, benchmark.Dataset(),
+                count=4, concurrency=2, warmup=1)
+
+    def test_asgi_driver(self):
+        """ASGI-вход с сессией и CSRF."""
+        driver = benchmark.AsgiDriver()
+        try:
+            results = benchmark.run(
+                driver, ['index', 'create'], benchmark.Dataset(),
+                count=2, concurrency=1, warmup=0)
+        finally:
+            driver.close()
+        self.assertEqual(
+            [row['errors'] for row in results.values()], [0, 0])
+        self.assertEqual(Post.objects.count(), 10 + 2)
+
+    def test_compare_finds_regressions(self):
+        row = {'rps': 100, 'p50_ms': 5, 'p95_ms': 10, 'p99_ms': 20}
+        baseline = {'results': {'client': {'index': row}}}
+        report = {'results': {'client': {
+            'index': dict(row, p95_ms=12), 'detail': row,
+        }}}
+        lines, regressions = benchmark.compare(baseline, report, 10)
+        self.assertEqual(regressions, ['client:index'])
+        self.assertIn(
+            'client:detail: нет в базовой линии', lines)
@@ -0,0 +1,103 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import delete, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import variants
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def enqueue(image_name):
+    """Ставит картинку в очередь миниатюр."""
+    done = ThumbnailJob.objects.filter(
+        image=image_name, status=ThumbnailJob.DONE).exists()
+    if done and variants.attach(image_name):
+        return
+    ThumbnailJob.objects.update_or_create(
+        image=image_name,
+        defaults={'status': ThumbnailJob.PENDING, 'attempts': 0},
+    )
+    if settings.THUMBNAIL_PIPELINE_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_worker, image_name))
+    else:
+        process(image_name)
+
+
+def run_in_worker(image_name):
+    close_old_connections()
+    try:
+        process(image_name)
+    finally:
+        close_old_connections()
+
+
+def source_file(image_name):
+    """Исходник sorl в хранилище Post.image."""
+    return ImageFile(image_name, Post.image.field.storage)
+
+
+def discard(image_name):
+    """Удаляет миниатюры ненужной картинки."""
+    delete(source_file(image_name), delete_file=False)
+    variants.delete_files(image_name)
+    ThumbnailJob.objects.filter(image=image_name).delete()
+
+
+def process(image_name):
+    """Генерирует миниатюры и версии."""
+    claimed = ThumbnailJob.objects.filter(
+        Q(status=ThumbnailJob.PENDING)
+        | Q(status=ThumbnailJob.FAILED,
+            attempts__lt=settings.THUMBNAIL_MAX_ATTEMPTS),
+        image=image_name,
+    ).update(status=ThumbnailJob.PROCESSING, updated=timezone.now())
+    if not claimed:
+        return False
+    try:
+        for geometry, options in settings.THUMBNAIL_SIZES:
+            get_thumbnail(source_file(image_name), geometry, **options)
+        variants.generate(image_name)
+    except Exception as error:
+        logger.exception('Ошибка миниатюр %s', image_name)
+        job = ThumbnailJob.objects.get(image=image_name)
+        job.status = ThumbnailJob.FAILED
+        job.attempts += 1
+        job.error = str(error)
+        job.save()
+        return False
+    ThumbnailJob.objects.filter(image=image_name).update(
+        status=ThumbnailJob.DONE, error='', updated=timezone.now())
+    return True
+
+
+def requeue_abandoned():
+    """Возвращает брошенные задания."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.THUMBNAIL_LEASE_TIMEOUT)
+    return ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PROCESSING, updated__lt=deadline,
+    ).update(status=ThumbnailJob.PENDING, updated=timezone.now())
@@ -0,0 +1,189 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from . import feed_cache
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator, fetch_window
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_WORKERS,
+                thread_name_prefix='timeline',
+            )
+    return _executor
+
+
+def is_celebrity(author):
+    """Автор без раскладки по лентам."""
+    return UserStats.objects.filter(user=author, celebrity=True).exists()
+
+
+def celebrity_ids(user):
+    """Популярные авторы из подписок."""
+    return list(Follow.objects.filter(
+        user=user, author__stats__celebrity=True,
+    ).values_list('author_id', flat=True))
+
+
+def promote(author_id=None):
+    """Отмечает авторов выше порога."""
+    stats = UserStats.objects.filter(
+        celebrity=False,
+        followers_count__gt=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    )
+    if author_id is not None:
+        stats = stats.filter(user_id=author_id)
+    return stats.update(celebrity=True)
+
+
+def demotable(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        celebrity=True,
+        followers_count__lte=settings.TIMELINE_DEMOTE_FOLLOWERS,
+    )
+
+
+def get_follower_ids(author):
+    """Подписчики, в чьи ленты идут посты."""
+    return list(Follow.objects.filter(author=author).exclude(
+        author__stats__celebrity=True).values_list('user_id', flat=True))
+
+
+def fan_out_post(post):
+    """Раскладывает пост; id подписчиков."""
+    follower_ids = get_follower_ids(post.author)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+    )
+    return follower_ids
+
+
+def add_author(user, author):
+    """Посты автора в ленту подписчика."""
+    if is_celebrity(author):
+        return
+    posts = Post.objects.filter(author=author).values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user.id,
+                post_id=post_id,
+                author_id=author.id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def schedule_demotion(author_id):
+    """Раскладка автора ниже порога в фоне."""
+    if not demotable(author_id).exists():
+        return
+    if settings.TIMELINE_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(demote_in_worker, author_id))
+    else:
+        demote(author_id)
+
+
+def demote_in_worker(author_id):
+    close_old_connections()
+    try:
+        demote(author_id)
+    except Exception:
+        logger.exception('Не разложен автор %s', author_id)
+    finally:
+        close_old_connections()
+
+
+def demote(author_id):
+    """Снимает статус и раскладывает посты."""
+    # Статус и записи меняются вместе:
+    # лента не теряет посты автора.
+    with transaction.atomic():
+        if not demotable(author_id).update(celebrity=False):
+            return []
+        entry = TimelineEntry._meta
+        post = Post._meta
+        follow = Follow._meta
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entry.db_table} '
+                '(user_id, post_id, author_id, pub_date) '
+                'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+                f'FROM {post.db_table} p '
+                f'JOIN {follow.db_table} f ON f.author_id = p.author_id '
+                'WHERE p.author_id = %s AND NOT EXISTS ('
+                f'SELECT 1 FROM {entry.db_table} t '
+                'WHERE t.user_id = f.user_id AND t.post_id = p.id)',
+                [author_id],
+            )
+        follower_ids = list(Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+    feed_cache.bump(*map(feed_cache.follow_feed, follower_ids))
+    return follower_ids
+
+
+def remove_author(user, author):
+    """Убирает посты автора из ленты."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок из TimelineEntry."""
+
+    def __init__(self, user, per_page, posts=None, **kwargs):
+        self.user = user
+        self.posts = posts
+        if posts is None:
+            self.posts = Post.objects.select_related('author', 'group')
+        entries = TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-post_id')
+        super().__init__(entries, per_page, **kwargs)
+
+    def fetch(self, after_key, before_key, limit):
+        entries, has_more = fetch_window(
+            self.object_list.only('pub_date', 'post_id'),
+            ('pub_date', 'post_id'), after_key, before_key, limit)
+        keys = {(entry.pub_date, entry.post_id) for entry in entries}
+        celebrities = celebrity_ids(self.user)
+        if celebrities:
+            posts, more_posts = fetch_window(
+                Post.objects.filter(author_id__in=celebrities).only(
+                    'pub_date', 'id'),
+                ('pub_date', 'id'), after_key, before_key, limit)
+            keys.update((post.pub_date, post.id) for post in posts)
+            has_more = has_more or more_posts or len(keys) > limit
+        keys = sorted(keys, reverse=True)
+        keys = keys[-limit:] if before_key is not None else keys[:limit]
+        posts = self.load_posts([post_id for _, post_id in keys])
+        return [posts[post_id] for _, post_id in keys], has_more
+
+    def load_posts(self, ids):
+        return self.posts.in_bulk(ids)
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Форматы без перекодирования;
+# прочие сохраняются в PNG.
+KEEP_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+PNG_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I')
+
+_decode_slots = None
+_decode_lock = threading.Lock()
+
+
+def get_decode_slots():
+    """Семафор декодирований процесса."""
+    global _decode_slots
+    with _decode_lock:
+        if _decode_slots is None:
+            _decode_slots = threading.BoundedSemaphore(
+                settings.IMAGE_UPLOAD_DECODERS)
+    return _decode_slots
+
+
+def open_upload(upload):
+    """Лениво открывает загрузку."""
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(BytesIO(upload.read()))
+
+
+def needs_rewrite(image):
+    return (
+        image.format not in KEEP_FORMATS
+        or max(image.size) > settings.IMAGE_UPLOAD_MAX_SIDE
+        or 'exif' in image.info
+        or 'xmp' in image.info
+    )
+
+
+def normalize_image(upload):
+    """Проверяет и пересохраняет картинку."""
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)},
+        )
+    try:
+        image = open_upload(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Изображение слишком большое.',
+            code='too_many_pixels')
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        image.close()
+        raise ValidationError(
+            'Изображение слишком большое: '
+            '%(width)s×%(height)s пикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    if not needs_rewrite(image):
+        image.close()
+        upload.seek(0)
+        return upload
+    if (image.format != 'JPEG'
+            and width * height > settings.IMAGE_UPLOAD_MAX_DECODE_PIXELS):
+        image.close()
+        raise ValidationError(
+            'Изображение слишком большое: '
+            'уменьшите его до %(limit)s '
+            'мегапикселей или сохраните '
+            'в JPEG.',
+            code='too_many_pixels',
+            params={
+                'limit': settings.IMAGE_UPLOAD_MAX_DECODE_PIXELS // 10 ** 6},
+        )
+    with image, get_decode_slots():
+        return rewrite(upload, image)
+
+
+def rewrite(upload, image):
+    max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+    image_format = image.format
+    name = os.path.basename(upload.name)
+    if image_format not in KEEP_FORMATS:
+        image_format = 'PNG'
+        name = os.path.splitext(name)[0] + '.png'
+    if image_format == 'JPEG':
+        image.draft('RGB', (max_side, max_side))
+    icc_profile = image.info.get('icc_profile')
+    transposed = ImageOps.exif_transpose(image)
+    transposed.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image_format == 'PNG' and transposed.mode not in PNG_MODES:
+        transposed = transposed.convert('RGBA')
+    result = File(
+        tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
+        name=name,
+    )
+    options = {'optimize': True}
+    if image_format == 'JPEG':
+        options['quality'] = settings.IMAGE_UPLOAD_QUALITY
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    transposed.save(result.file, image_format, **options)
+    result.seek(0)
+    return result
@@ -0,0 +1,101 @@
+"""Валидаторы условных GET для лент."""
+from django.shortcuts import get_object_or_404
+
+from core.decorators import viewer_key
+from . import feed_cache
+from .models import Comment, Group, Post, TimelineEntry, User
+from .timeline import celebrity_ids
+
+
+def newest_pub_date(posts):
+    return posts.order_by('-pub_date').values_list(
+        'pub_date', flat=True).first()
+
+
+def get_group(request, slug):
+    if not hasattr(request, 'group'):
+        request.group = get_object_or_404(Group, slug=slug)
+    return request.group
+
+
+def get_author(request, username):
+    if not hasattr(request, 'author'):
+        request.author = get_object_or_404(
+            User.objects.select_related('stats'), username=username)
+    return request.author
+
+
+def index_validators(request, extra=''):
+    return feed_cache.feed_validators(
+        request, newest_pub_date(Post.objects), feed_cache.GLOBAL_FEED,
+        extra=extra)
+
+
+def group_validators(request, slug, extra=''):
+    group = get_group(request, slug)
+    return feed_cache.feed_validators(
+        request, newest_pub_date(group.posts),
+        feed_cache.group_feed(group.id), extra=extra)
+
+
+def profile_validators(request, username, extra=''):
+    author = get_author(request, username)
+    # Подписчики не сдвигают ленту.
+    stats = getattr(author, 'stats', None)
+    if stats is not None:
+        extra = (f'{extra}|{stats.posts_count}|{stats.followers_count}'
+                 f'|{stats.following_count}')
+    return feed_cache.feed_validators(
+        request, newest_pub_date(author.posts),
+        feed_cache.author_feed(author.id), extra=extra)
+
+
+def follow_validators(request, extra=''):
+    user = request.user
+    celebrities = celebrity_ids(user)
+    dates = [newest_pub_date(TimelineEntry.objects.filter(user=user))]
+    if celebrities:
+        dates.append(newest_pub_date(
+            Post.objects.filter(author_id__in=celebrities)))
+    newest = max(filter(None, dates), default=None)
+    return feed_cache.feed_validators(
+        request, newest, feed_cache.follow_feed(user.id),
+        *map(feed_cache.author_feed, celebrities), extra=extra)
+
+
+def post_validators(request, post_id, extra=''):
+    post = get_object_or_404(
+        Post.objects.values('author_id', 'pub_date', 'comments_count'),
+        id=post_id,
+    )
+    newest_comment = Comment.objects.filter(post_id=post_id).order_by(
+        '-created').values_list('created', flat=True).first()
+    # Комментарии не сдвигают ленту.
+    extra = f'{extra}|{post["comments_count"]}|{newest_comment}'
+    newest = max(filter(None, (post['pub_date'], newest_comment)))
+    return feed_cache.feed_validators(
+        request, newest, feed_cache.author_feed(post['author_id']),
+        extra=extra)
+
+
+def search_validators(request, extra=''):
+    return feed_cache.feed_validators(
+        request, None, feed_cache.GLOBAL_FEED, extra=extra)
+
+
+def page_validators(validators_func):
+    """Добавляет зрителя в ETag страницы."""
+    def validators(request, *args, **kwargs):
+        extra = viewer_key(request)
+        follow_version = None
+        if request.user.is_authenticated:
+            follow_version = feed_cache.get_version(
+                feed_cache.follow_feed(request.user.id))
+            extra += '|' + follow_version
+        etag, last_modified = validators_func(
+            request, *args, extra=extra, **kwargs)
+        if follow_version is not None:
+            last_modified = max(
+                last_modified, feed_cache.version_time(follow_version))
+        return f'W/"{etag}"', last_modified
+    return validators
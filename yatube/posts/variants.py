@@ -0,0 +1,106 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import ImageVariant, Post
+
+PIL_FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP', 'avif': 'AVIF'}
+
+
+def available_formats():
+    """Форматы, доступные Pillow."""
+    Image.init()
+    formats = [
+        fmt for fmt in settings.IMAGE_VARIANT_FORMATS
+        if PIL_FORMATS[fmt] in Image.SAVE
+    ]
+    if 'jpeg' not in formats:
+        formats.append('jpeg')
+    return formats
+
+
+def variant_name(image_name, width, fmt):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'posts/variants/{stem}_{width}.{fmt}'
+
+
+def encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        image = image.convert('RGB')
+    image.save(
+        buffer, PIL_FORMATS[fmt], quality=settings.IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def generate(image_name):
+    """Нарезает версии картинки."""
+    post_ids = list(
+        Post.objects.filter(image=image_name).values_list('id', flat=True))
+    if not post_ids:
+        return
+    ratio_width, ratio_height = settings.IMAGE_VARIANT_ASPECT
+    with default_storage.open(image_name) as source:
+        original = Image.open(source)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    widths = [
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width <= original.width
+    ] or [original.width]
+    variants = []
+    for width in widths:
+        height = max(1, round(width * ratio_height / ratio_width))
+        resized = ImageOps.fit(original, (width, height), Image.LANCZOS)
+        for fmt in available_formats():
+            name = variant_name(image_name, width, fmt)
+            data = encode(resized, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(data))
+            variants.append((name, fmt, width, height, len(data)))
+    link(post_ids, variants)
+
+
+def link(post_ids, variants):
+    """Привязывает версии к постам."""
+    ImageVariant.objects.filter(post_id__in=post_ids).delete()
+    ImageVariant.objects.bulk_create([
+        ImageVariant(
+            post_id=post_id,
+            file=name,
+            format=fmt,
+            width=width,
+            height=height,
+            size=size,
+        )
+        for post_id in post_ids
+        for name, fmt, width, height, size in variants
+    ])
+    Post.objects.filter(id__in=post_ids).update(variants_ready=True)
+
+
+def attach(image_name):
+    """Отдаёт постам готовые версии."""
+    donor = Post.objects.filter(
+        image=image_name, variants_ready=True).values_list(
+        'id', flat=True).first()
+    if donor is None:
+        return False
+    post_ids = list(Post.objects.filter(
+        image=image_name, variants_ready=False).values_list('id', flat=True))
+    if post_ids:
+        link(post_ids, ImageVariant.objects.filter(post_id=donor).values_list(
+            'file', 'format', 'width', 'height', 'size'))
+    return True
+
+
+def delete_files(image_name):
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        for fmt in PIL_FORMATS:
+            default_storage.delete(variant_name(image_name, width, fmt))
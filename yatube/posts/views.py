@@ -1,70 +1,134 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
-from django.conf import settings
+from django.utils.http import urlencode
 
+from core.decorators import conditional, public_if_anonymous, query_budget
+from . import feed_cache, search, thumbnails
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
+from .fragments import render_cards
+from .models import Comment, Post, User, Follow
+from .paginator import CommentPaginator, CursorPaginator
+from .streaming import render_streaming
+from .timeline import TimelinePaginator, celebrity_ids
+from .validators import (
+    follow_validators, get_author, get_group, group_validators,
+    index_validators, page_validators, post_validators, profile_validators,
+    search_validators,
+)
 
 COUNT_POSTS = 10
 
 
-def get_paginator_obj(request, posts):
-    paginator = Paginator(posts, COUNT_POSTS)
+def get_paginator_obj(request, posts, feed, *depends_on):
+    paginator = CursorPaginator(posts, COUNT_POSTS)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        # Старые ссылки ?page=N.
+        return paginator.get_legacy_page(page_number)
+    return feed_cache.get_feed_page(request, paginator, feed, *depends_on)
+
+
+def get_comments_page(request, comments):
+    """Комментарии после курсора after."""
+    paginator = CommentPaginator(
+        comments.select_related('author'), settings.COMMENTS_PER_PAGE)
+    return paginator.get_page(after=request.GET.get('after'))
 
 
-@cache_page(settings.TIME_CACHE)
+@query_budget(6)
+@public_if_anonymous
+@conditional(page_validators(index_validators))
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
-    page_obj = get_paginator_obj(request, post_list)
+    page_obj = get_paginator_obj(
+        request, post_list, feed_cache.GLOBAL_FEED)
     context = {
         'page_obj': page_obj,
+        'cards': render_cards(page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(7)
+@public_if_anonymous
+@conditional(page_validators(group_validators))
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = get_paginator_obj(request, posts)
+    group = get_group(request, slug)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = get_paginator_obj(
+        request, posts, feed_cache.group_feed(group.id))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cards': render_cards(page_obj),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(8)
+@public_if_anonymous
+@conditional(page_validators(profile_validators))
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = get_paginator_obj(request, post_list)
+    author = get_author(request, username)
+    post_list = author.posts.select_related('author', 'group')
+    page_obj = get_paginator_obj(
+        request, post_list, feed_cache.author_feed(author.id))
     following = request.user.is_authenticated and (
         Follow.objects.filter(
             user=request.user, author=author).exists())
     context = {
         'author': author,
         'page_obj': page_obj,
+        'cards': render_cards(page_obj),
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(8)
+@public_if_anonymous
+@conditional(page_validators(post_validators))
 def post_detail(request, post_id):
-    user_post = get_object_or_404(Post, id=post_id)
+    user_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = user_post.comments.all()
     context = {
         'user_post': user_post,
+        'post_id': post_id,
         'form': form,
-        'comments': comments,
     }
+    if settings.STREAM_PAGES:
+        # Все комментарии серверным
+        # курсором, без догрузки.
+        comments = user_post.comments.select_related('author').order_by(
+            '-created', '-id').iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+        return render_streaming(
+            request, 'posts/post_detail.html', context, 'comments',
+            comments, 'includes/comments.html',
+        )
+    comments_page = get_comments_page(request, user_post.comments)
+    context['comments'] = context['comments_page'] = comments_page
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(5)
+@public_if_anonymous
+@conditional(page_validators(post_validators))
+def post_comments(request, post_id):
+    """Догрузка комментариев поста."""
+    comments_page = get_comments_page(
+        request, Comment.objects.filter(post_id=post_id))
+    context = {
+        'post_id': post_id,
+        'comments': comments_page,
+        'comments_page': comments_page,
+    }
+    return render(request, 'posts/includes/comments_page.html', context)
+
+
+@query_budget(20)
+@public_if_anonymous
 @login_required
 def post_create(request):
     form = PostForm(
@@ -75,6 +139,8 @@ def post_create(request):
         create_post = form.save(commit=False)
         create_post.author = request.user
         form.save()
+        if create_post.image:
+            thumbnails.enqueue(create_post.image.name)
 
         return redirect('posts:profile', create_post.author)
 
@@ -84,10 +150,12 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(20)
+@public_if_anonymous
 @login_required
 def post_edit(request, post_id):
     select_post = get_object_or_404(Post, id=post_id)
-    if request.user != select_post.author:
+    if request.user.id != select_post.author_id:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -95,7 +163,11 @@ def post_edit(request, post_id):
         instance=select_post,
     )
     if form.is_valid():
-        form.save()
+        if 'image' in form.changed_data:
+            form.instance.variants_ready = False
+        post = form.save()
+        if 'image' in form.changed_data and post.image:
+            thumbnails.enqueue(post.image.name)
         return redirect('posts:post_detail', post_id)
 
     context = {
@@ -105,6 +177,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -117,16 +190,26 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(10)
+@public_if_anonymous
 @login_required
+@conditional(page_validators(follow_validators))
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator_obj(request, post_list)
+    paginator = TimelinePaginator(request.user, COUNT_POSTS)
+    page_obj = feed_cache.get_feed_page(
+        request,
+        paginator,
+        feed_cache.follow_feed(request.user.id),
+        *map(feed_cache.author_feed, celebrity_ids(request.user)),
+    )
     context = {
         'page_obj': page_obj,
+        'cards': render_cards(page_obj),
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(15)
 @login_required
 def profile_follow(request, username):
     user = get_object_or_404(User, username=username)
@@ -135,9 +218,30 @@ def profile_follow(request, username):
     return redirect('posts:profile', username)
 
 
+@query_budget(15)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(
         user=request.user, author=author).delete()
     return redirect('posts:profile', username)
+
+
+@query_budget(5)
+@public_if_anonymous
+@conditional(page_validators(search_validators))
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search.get_paginator(query, COUNT_POSTS).get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'cards': render_cards(page_obj or []),
+        'pager_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
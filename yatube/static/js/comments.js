@@ -0,0 +1,18 @@
+// Догрузка комментариев: ссылка «Показать ещё» заменяется следующей
+// пачкой с фрагмента posts:post_comments. Без JS ссылка открывает
+// страницу поста с этой пачкой.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-comments-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.commentsMore, {credentials: 'same-origin'})
+    .then(function (response) {
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('afterend', html);
+      link.remove();
+    });
+});
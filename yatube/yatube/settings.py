@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,10 +32,11 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,9 +44,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
+# debug_toolbar — только для разработки.
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
@@ -66,6 +73,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потоки Django для ASGI-входа.
+ASGI_THREADS = int(os.getenv('YATUBE_ASGI_THREADS', 8))
+
 
 DATABASES = {
     'default': {
@@ -118,17 +128,124 @@ POSTS_CHIK = 10
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# L1 в процессе перед общим кэшем shared.
+# В продакшене shared — Redis/memcached;
+# add() файлового кэша атомарен под flock.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'SHARED_ONLY_PREFIXES': ['feed_gen:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+    },
 }
 
-TIME_CACHE = 20
+# Кэш страниц лент и блокировка пересчёта.
+FEED_CACHE_FRESH_TIME = 60
+FEED_CACHE_TIME = 60 * 60 * 24
+FEED_LOCK_TIME = 10
+FEED_LOCK_WAIT = 1
+
+# Предел старых ссылок ?page=N.
+LEGACY_PAGE_LIMIT = 10
+
+CARD_CACHE_TIME = 60 * 60
+
+# Админка: предел COUNT и кэш <select>.
+ADMIN_COUNT_LIMIT = 10_000
+ADMIN_CHOICES_CACHE_TIME = 60 * 60
+
+# Комментариев в одной пачке.
+COMMENTS_PER_PAGE = 50
+
+# Потоковая отдача страницы поста.
+STREAM_PAGES = False
+STREAM_CHUNK_SIZE = 100
+
+# Строгий бюджет запросов: тесты и
+# YATUBE_QUERY_BUDGET_STRICT=1.
+QUERY_BUDGET_STRICT = os.getenv('YATUBE_QUERY_BUDGET_STRICT') == '1'
+QUERY_BUDGET_IGNORED_TABLES = ['thumbnail_kvstore']
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Метрики запросов (core.metrics).
+METRICS_SAMPLE_RATE = float(os.getenv('YATUBE_METRICS_SAMPLE_RATE', 0))
+METRICS_NAMESPACES = ['posts', 'users', 'about']
+METRICS_CACHE_ALIASES = ['default']
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+# Bearer-токен; пустой — /metrics/ закрыт.
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN', '')
+
+# Журнал запросов (core.querylog);
+# QUERY_LOG_DIR — 0700, не общий /tmp.
+QUERY_LOG_ENABLED = os.getenv('YATUBE_QUERY_LOG') == '1'
+QUERY_LOG_SLOW_MS = 100
+QUERY_LOG_FLUSH_INTERVAL = 10
+QUERY_LOG_DIR = os.getenv(
+    'YATUBE_QUERY_LOG_DIR', os.path.join(BASE_DIR, 'querylog'))
+
+# Базовые линии benchmark и допуск, %.
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+BENCHMARK_THRESHOLD = 10
+
+# Посты популярных авторов — при чтении.
+# Статус снимается, когда подписчиков
+# не больше TIMELINE_DEMOTE_FOLLOWERS.
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+TIMELINE_DEMOTE_FOLLOWERS = 900
+TIMELINE_BATCH_SIZE = 500
+TIMELINE_ASYNC = not DEBUG
+TIMELINE_WORKERS = 1
+
+# Миниатюры {% thumbnail %} заранее.
+THUMBNAIL_SIZES = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+THUMBNAIL_PIPELINE_ASYNC = not DEBUG
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_MAX_ATTEMPTS = 3
+# Срок аренды задания, секунды.
+THUMBNAIL_LEASE_TIMEOUT = 10 * 60
+
+# Массовая модерация: пачка, порог фона.
+MODERATION_CHUNK_SIZE = 500
+MODERATION_BACKGROUND_THRESHOLD = 5000
+MODERATION_ASYNC = not DEBUG
+MODERATION_WORKERS = 1
+# Срок аренды задания, секунды.
+MODERATION_LEASE_TIMEOUT = 10 * 60
+
+# Версии картинок для <picture>/srcset.
+IMAGE_VARIANT_WIDTHS = [320, 640, 960]
+IMAGE_VARIANT_ASPECT = (960, 339)
+IMAGE_VARIANT_FORMATS = ['avif', 'webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_SIZES = '(max-width: 960px) 100vw, 960px'
+
+# Лимиты загрузки картинок.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+IMAGE_UPLOAD_MAX_DECODE_PIXELS = 12_000_000
+IMAGE_UPLOAD_MAX_SIDE = 2560
+IMAGE_UPLOAD_QUALITY = 90
+IMAGE_UPLOAD_DECODERS = 2
+
+# HTTP-кэш страниц; релиз входит в ETag.
+PAGE_CACHE_MAX_AGE = 60
+RELEASE = os.getenv('YATUBE_RELEASE', '')